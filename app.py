@@ -1,40 +1,148 @@
+import time
+STARTUP_TIME = time.perf_counter()  # 模块开始导入的时间，--measure-startup 用它统计启动耗时
 import sys
 import json
+import hashlib
+import math
+import struct
+import sqlite3
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import importlib.util
+# 可选依赖，仅协程下载引擎需要；导入aiohttp需要0.2秒左右，第一次使用协程引擎时才导入
+AIOHTTP_AVAILABLE = importlib.util.find_spec('aiohttp') is not None
+aiohttp = None
+try:
+    import orjson  # 可选依赖，解析大数据包更快
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 import subprocess
+import heapq
+import re
+import threading
+import socket
+import asyncio
+import concurrent.futures
+import itertools
+import random
+import email.utils
+import atexit
+import logging
+import logging.handlers
+import queue
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from collections import deque
 
-# 1. 首先设置环境变量
-os.environ["QTWEBENGINE_CHROMIUM_FLAGS"] = "--disable-gpu --no-sandbox"
-os.environ["QT_AUTO_SCREEN_SCALE_FACTOR"] = "0"  # 禁用自动高DPI缩放
-os.environ["QT_QUICK_BACKEND"] = "software"  # 添加软件渲染
-
-# 2. 导入Qt核心模块
-from PyQt5.QtCore import Qt, QUrl, pyqtSlot, QObject, QThread, pyqtSignal, QTimer
+from PyQt5.QtCore import (
+    Qt, QUrl, pyqtSlot, QObject, QThread, pyqtSignal, QTimer, QAbstractTableModel,
+    QModelIndex, QRect, QSize, QEvent, QCoreApplication
+)
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QWidget, QTextEdit, 
     QPushButton, QLabel, QLineEdit, QHBoxLayout, QProgressBar,
-    QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog,
-    QMessageBox, QTabWidget, QStyle, QAbstractItemView, QFrame
+    QTableView, QStyledItemDelegate, QStyleOptionProgressBar, QStyleOptionButton, QHeaderView, QFileDialog,
+    QMessageBox, QTabWidget, QStyle, QAbstractItemView, QFrame, QSpinBox,
+    QComboBox, QMenu, QInputDialog
 )
 
-# 3. 设置必要的Qt属性
-QApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
-QApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
-
-# 4. 创建QApplication实例
-app = QApplication(sys.argv)
-
-# 5. 现在可以安全导入WebEngine和其他组件
-from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEnginePage, QWebEngineProfile
-from PyQt5.QtWebEngineCore import QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo
-
-# 6. 配置WebEngine
-profile = QWebEngineProfile.defaultProfile()
-profile.setHttpCacheType(QWebEngineProfile.MemoryHttpCache)
+# 日志：每个子系统使用自己的 douyin.<子系统> 记录器，级别可以分别设置（--log-level download=DEBUG）；
+# 逐块、逐个视频的消息都是DEBUG级别，默认不输出
+LOG_SUBSYSTEMS = ('download', 'scheduler', 'extractor', 'crawler', 'ui', 'browser', 'cli')
+log = logging.getLogger('douyin')
+download_log = logging.getLogger('douyin.download')
+scheduler_log = logging.getLogger('douyin.scheduler')
+extractor_log = logging.getLogger('douyin.extractor')
+crawler_log = logging.getLogger('douyin.crawler')
+ui_log = logging.getLogger('douyin.ui')
+cli_log = logging.getLogger('douyin.cli')
+
+# LogRecord自带的属性，其余的都是通过extra传入的结构化字段（task_id、aweme_id、host等）
+_LOG_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+def log_fields(record):
+    return {k: v for k, v in vars(record).items() if k not in _LOG_RECORD_FIELDS}
+
+class TextLogFormatter(logging.Formatter):
+    """普通文本格式，结构化字段以 key=value 追加在消息后面"""
+
+    def format(self, record):
+        text = super().format(record)
+        fields = log_fields(record)
+        if fields:
+            text += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return text
+
+class JsonLogFormatter(logging.Formatter):
+    """每条日志一行JSON，便于用jq等工具过滤"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(log_fields(record))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def parse_log_levels(spec):
+    """解析 "INFO" 或 "WARNING,download=DEBUG"，返回 (默认级别, {子系统: 级别})"""
+    default = logging.INFO
+    levels = {}
+    for part in filter(None, (p.strip() for p in (spec or '').split(','))):
+        name, _, level_name = part.rpartition('=')
+        level = logging.getLevelName(level_name.strip().upper())
+        if not isinstance(level, int):
+            raise ValueError(f"未知的日志级别: {level_name}")
+        if not name:
+            default = level
+        elif name.strip() in LOG_SUBSYSTEMS:
+            levels[name.strip()] = level
+        else:
+            raise ValueError(f"未知的日志子系统: {name}（可选: {', '.join(LOG_SUBSYSTEMS)}）")
+    return default, levels
+
+_log_listener = None
+
+def setup_logging(level='INFO', log_file=None, fmt='text'):
+    """配置douyin.*记录器
+
+    记录日志的线程只把记录放进队列，格式化后的写出在QueueListener的后台线程中完成，
+    下载线程和界面线程不会因为终端或磁盘输出慢而被阻塞。可以重复调用以修改配置。
+    """
+    global _log_listener
+    default, levels = parse_log_levels(level)
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    formatter = JsonLogFormatter() if fmt == 'json' else \
+        TextLogFormatter('%(asctime)s %(levelname)-7s %(name)s: %(message)s', '%H:%M:%S')
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    if _log_listener is not None:
+        _log_listener.stop()
+    else:
+        atexit.register(lambda: _log_listener.stop())
+    records = queue.SimpleQueue() if hasattr(queue, 'SimpleQueue') else queue.Queue()
+    for handler in list(log.handlers):
+        log.removeHandler(handler)
+    log.addHandler(logging.handlers.QueueHandler(records))
+    log.setLevel(default)
+    log.propagate = False
+    for name in LOG_SUBSYSTEMS:
+        logging.getLogger(f'douyin.{name}').setLevel(levels.get(name, logging.NOTSET))
+    _log_listener = logging.handlers.QueueListener(records, *handlers)
+    _log_listener.start()
+
+# 导入本模块不会创建QApplication，也不会加载WebEngine：
+# 图形界面由create_application初始化，命令行模式(--headless)完全不需要它们
 
 MODERN_DARK_STYLE = """
 QWidget {
@@ -104,7 +212,7 @@ QPushButton#GlobalControlButton:hover {
     border-color: #00aaff;
 }
 
-QLineEdit {
+QLineEdit, QSpinBox, QComboBox {
     background-color: #3c3c3c;
     border: 1px solid #555555;
     border-radius: 5px;
@@ -136,7 +244,7 @@ QProgressBar::chunk {
     border-radius: 4px;
 }
 
-QTableWidget {
+QTableView {
     background-color: #2b2b2b;
     gridline-color: #3c3c3c;
     border: 1px solid #3c3c3c;
@@ -145,7 +253,7 @@ QTableWidget {
     selection-color: #ffffff;
 }
 
-QTableWidget::item {
+QTableView::item {
     padding: 8px;
     border: none;
 }
@@ -178,175 +286,1252 @@ QScrollBar::add-line:horizontal, QScrollBar::sub-line:horizontal { width: 0px; }
 QMessageBox { background-color: #2e2f30; }
 """
 
+# 模拟浏览器的请求头，下载和内置浏览器共用同一个User-Agent
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+BROWSER_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': '*/*',
+    'Accept-Encoding': 'identity;q=1, *;q=0',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Referer': 'https://www.douyin.com/',
+    'Origin': 'https://www.douyin.com',
+    'Sec-Fetch-Dest': 'video',
+    'Sec-Fetch-Mode': 'cors',
+    'Sec-Fetch-Site': 'cross-site'
+}
+
+class PooledHttpSession:
+    """所有下载任务共享的HTTP连接池，按CDN主机保持长连接"""
+
+    def __init__(self, pool_connections=32, pool_maxsize=32, max_retries=2, backoff_factor=0.1):
+        # 这里只快速重试建立连接失败；5xx和超时交给下载管理器的RetryPolicy，
+        # 退避等待时不会占着下载线程和并发槽位
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=0,
+            backoff_factor=backoff_factor,
+            allowed_methods=frozenset(['HEAD', 'GET']),
+            raise_on_status=False
+        )
+        # pool_connections: 缓存的主机连接池数量；pool_maxsize: 每个主机保留的连接数
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                   max_retries=retry)
+        self._local = threading.local()
+
+    def session(self):
+        """requests.Session的Cookie等状态不是线程安全的，每个线程各用一个Session，但共享连接池"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(BROWSER_HEADERS)
+            session.mount('http://', self.adapter)
+            session.mount('https://', self.adapter)
+            self._local.session = session
+        return session
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', (10, 30))
+        return self.session().get(url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault('timeout', (10, 30))
+        return self.session().head(url, **kwargs)
+
+    def stats(self):
+        """返回请求数、新建连接数和复用次数"""
+        pools = self.adapter.poolmanager.pools
+        requests_count = connections = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                requests_count += pool.num_requests
+                connections += pool.num_connections
+        return {
+            'requests': requests_count,
+            'connections': connections,
+            'reused': max(0, requests_count - connections)
+        }
+
+http_pool = PooledHttpSession()
+
+# 任务数据库等程序数据的存放目录
+APP_DATA_DIR = os.path.join(os.path.expanduser("~"), ".douyin_downloader")
+
+# 下载文件名末尾的aweme_id，例如 "标题_7301234567890123456.mp4"
+DOWNLOADED_FILE_PATTERN = re.compile(r'_(\d{6,})\.mp4$')
+
+def load_aiohttp():
+    """按需导入aiohttp，之后模块中的aiohttp指向已导入的模块"""
+    global aiohttp
+    if aiohttp is None:
+        import aiohttp as module
+        aiohttp = module
+    return aiohttp
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """计算文件内容的BLAKE2b摘要"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class TokenBucket:
+    """令牌桶限速器，多个下载线程共用；rate为每秒字节数，0表示不限速
+
+    令牌不足时在条件变量上等待到令牌足够为止，不会忙等；调整速率时唤醒所有等待者重新计算。
+    """
+
+    def __init__(self, rate=0, burst_seconds=0.5):
+        self.burst_seconds = burst_seconds  # 桶容量相当于多少秒的流量
+        self.cond = threading.Condition()
+        self.rate = 0
+        self.capacity = 0
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        with self.cond:
+            self._refill()
+            self.rate = max(0, int(rate))
+            self.capacity = max(64 * 1024, self.rate * self.burst_seconds)
+            self.tokens = min(self.tokens, self.capacity)
+            self.cond.notify_all()
+
+    def wake(self):
+        """唤醒等待中的线程，让暂停或取消的任务尽快退出"""
+        with self.cond:
+            self.cond.notify_all()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_consume(self, amount):
+        """令牌足够时扣除并返回0，否则返回还需等待的秒数"""
+        with self.cond:
+            return self._try_consume(amount)
+
+    def _try_consume(self, amount):
+        if not self.rate:
+            return 0
+        self._refill()
+        # 单次数据量大于桶容量时，桶满即可放行，欠下的令牌由后续请求偿还
+        needed = min(amount, self.capacity)
+        if self.tokens >= needed:
+            self.tokens -= amount
+            return 0
+        return (needed - self.tokens) / self.rate
+
+    def consume(self, amount, should_stop=None):
+        """阻塞直到可以传输amount字节，should_stop返回True时提前返回"""
+        with self.cond:
+            while True:
+                wait = self._try_consume(amount)
+                if not wait or (should_stop is not None and should_stop()):
+                    return
+                self.cond.wait(wait)
+
+    def chunk_size(self, default):
+        """限速时减小每次读取的块，使速度平滑并能及时响应速率调整"""
+        if not self.rate:
+            return default
+        return max(16 * 1024, min(default, self.rate // 10))
+
+# 所有下载任务共用的全局带宽上限
+global_bandwidth = TokenBucket()
+
+PROGRESS_EMIT_INTERVAL = 0.1  # 下载线程发送进度信号的最小间隔（秒）
+
+class DownloadError(IOError):
+    """服务器返回了错误状态码，status和retry_after供重试策略判断"""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after  # 服务器要求的等待秒数
+
+def parse_retry_after(value):
+    """解析Retry-After头，支持秒数和HTTP日期两种格式，无法解析时返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+class RetryPolicy:
+    """下载失败后的自动重试策略：指数退避加随机抖动，只重试服务器临时故障和网络错误"""
+    RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=60.0):
+        self.max_attempts = max_attempts  # 包括第一次在内的最大尝试次数
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def is_retryable(self, error):
+        if isinstance(error, DownloadError) and error.status is not None:
+            # 403/404等说明链接失效或无权访问，重试也不会成功
+            return error.status in self.RETRYABLE_STATUSES or error.status >= 500
+        if isinstance(error, (requests.Timeout, requests.ConnectionError, asyncio.TimeoutError)):
+            return True
+        if aiohttp is not None and isinstance(error, aiohttp.ClientError):
+            return True
+        if isinstance(error, OSError) and error.errno is not None:
+            return False  # 磁盘已满、权限不足等本地错误
+        return isinstance(error, IOError)
+
+    def delay(self, attempt, error=None):
+        """第attempt次重试前等待的秒数，服务器给出Retry-After时不少于该值"""
+        backoff = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        backoff = backoff / 2 + random.uniform(0, backoff / 2)  # 抖动，避免大量任务同时重试
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            return max(backoff, retry_after)
+        return backoff
+
+class MirrorStats:
+    """按CDN主机统计响应延迟和失败率，之后的任务优先使用更快、更稳定的镜像"""
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha  # 指数滑动平均的权重
+        self.lock = threading.Lock()
+        self.hosts = {}  # host -> [平均延迟(秒), 平均失败率, 样本数]
+
+    @staticmethod
+    def host(url):
+        return urlparse(url).netloc
+
+    def record(self, url, latency=None, ok=None):
+        """记录一次请求的延迟和/或成败"""
+        with self.lock:
+            entry = self.hosts.setdefault(self.host(url), [latency or 0.0, 0.0, 0])
+            if latency is not None:
+                entry[0] = latency if entry[2] == 0 else entry[0] + self.alpha * (latency - entry[0])
+                entry[2] += 1
+            if ok is not None:
+                entry[1] += self.alpha * ((0.0 if ok else 1.0) - entry[1])
+
+    def score(self, url):
+        """分数越低越优先，没有记录的主机按已知主机的平均延迟计算"""
+        with self.lock:
+            entry = self.hosts.get(self.host(url))
+            if entry is None or entry[2] == 0:
+                known = [e[0] for e in self.hosts.values() if e[2]]
+                latency = sum(known) / len(known) if known else 1.0
+                error_rate = entry[1] if entry is not None else 0.0
+            else:
+                latency, error_rate = entry[0], entry[1]
+        return latency * (1 + 4 * error_rate)
+
+    def order(self, urls):
+        """按分数给镜像排序，分数相同时保持接口返回的顺序"""
+        return sorted(urls, key=self.score)
+
+mirror_stats = MirrorStats()
+
 class DownloadTask(QObject):
     progress_updated = pyqtSignal(str, int, int)  # task_id, bytes_received, total_bytes
     status_updated = pyqtSignal(str, str)  # task_id, status
     download_finished = pyqtSignal(str, bool)  # task_id, success
 
-    def __init__(self, task_id, url, title, save_path):
+    def __init__(self, task_id, url, title, save_path, segments=1, segment_threshold=8 * 1024 * 1024,
+                 mirrors=None):
         super().__init__()
         self.task_id = task_id
-        self.url = url
+        # 同一视频的所有CDN地址，当前镜像失败时依次切换到下一个
+        self.mirrors = mirror_stats.order(list(dict.fromkeys(mirrors or [url])))
+        self.url = self.mirrors[0]  # 当前使用的镜像
         self.title = title
         self.save_path = save_path
         self.is_paused = False
         self.is_cancelled = False
-        self.thread = QThread()
-        self.moveToThread(self.thread)
-        self.thread.started.connect(self._download)
+        self.thread = None  # 线程在真正开始下载时才创建，排队中的任务不占用线程
         self.current_size = 0
         self.total_size = 0
+        self.etag = None  # 上次响应的ETag，用于校验断点续传时资源未变化
         self.response = None
+        self.is_completed = False
+        self.file_path = None
+        self.content_hash = None
+        self.last_progress_emit = 0.0
+        self.segments = segments  # 分段下载的连接数，1表示不分段
+        self.segment_threshold = segment_threshold  # 小于该大小的文件不分段
+        self.segment_responses = set()  # 分段模式下正在进行的响应，暂停/取消时一并关闭
+        self.segment_lock = threading.Lock()
+        self.last_error = None  # 最近一次失败的异常，供下载管理器判断是否重试
+        self.bandwidth = TokenBucket()  # 单个任务的限速，默认不限
 
     def start(self):
-        if not self.thread.isRunning():
-            self.thread.start()
+        if self.thread is not None and self.thread.isRunning():
+            if not self.is_paused:
+                return
+            # 上一次暂停的线程还在收尾，等它退出后再重新开始
+            self.thread.wait()
+        self.is_paused = False
+        self.is_cancelled = False
+        self.last_error = None
+        self.thread = QThread()
+        # 任务对象留在主线程，下载函数直接在新线程中执行
+        self.thread.started.connect(self._download, Qt.DirectConnection)
+        self.thread.start()
 
     def pause(self):
         self.is_paused = True
-        if self.response:
-            self.response.close()
+        self._close_responses()
+        self._wake_throttle()
+
+    def _wake_throttle(self):
+        self.bandwidth.wake()
+        global_bandwidth.wake()
+
+    def _throttle(self, size):
+        """按单任务和全局限速等待，直到可以继续读取"""
+        should_stop = lambda: self.is_paused or self.is_cancelled
+        self.bandwidth.consume(size, should_stop)
+        global_bandwidth.consume(size, should_stop)
+
+    def _chunk_size(self, default):
+        return min(self.bandwidth.chunk_size(default), global_bandwidth.chunk_size(default))
+
+    def _close_responses(self):
+        """从界面线程打断下载线程正在读取的响应
+
+        这里只关闭socket的读写，不调用response.close()：那样会把还有未读数据的连接放回共享连接池，
+        其他任务拿到后会把残留的视频数据当作响应头读取。读取被打断后由下载线程自己关闭响应。
+        """
+        with self.segment_lock:
+            responses = list(self.segment_responses)
+        for response in [self.response] + responses:
+            sock = getattr(getattr(getattr(response, 'raw', None), '_connection', None), 'sock', None)
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass  # 连接已经关闭
 
     def resume(self):
-        self.is_paused = False
-        if not self.thread.isRunning():
-            self.thread = QThread()
-            self.moveToThread(self.thread)
-            self.thread.started.connect(self._download)
-            self.thread.start()
+        self.start()
 
     def cancel(self):
         self.is_cancelled = True
-        if self.response:
-            self.response.close()
+        self._close_responses()
+        self._wake_throttle()
         if self.thread and self.thread.isRunning():
             self.thread.quit()
             self.thread.wait()
+        # 暂停、失败或等待重试的任务没有下载线程替它清理，临时文件在这里删除
+        self._remove_temp_files()
+
+    def _remove_temp_files(self):
+        """删除临时文件和分段状态文件"""
+        _, temp_file_path = self._target_paths()
+        for path in (temp_file_path, temp_file_path + ".parts", temp_file_path + ".parts.new"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
 
     def cleanup(self):
+        # 退出程序时按暂停处理，保留临时文件以便下次启动后续传
         if self.thread and self.thread.isRunning():
-            self.is_cancelled = True
-            if self.response:
-                self.response.close()
+            self.is_paused = True
+            self._close_responses()
             self.thread.quit()
             self.thread.wait()
 
+    def _target_paths(self):
+        """返回正式文件路径和临时文件路径"""
+        # 处理文件名中的非法字符
+        safe_title = "".join(c for c in self.title if c.isalnum() or c in (' ', '-', '_')).strip()
+        if not safe_title:
+            safe_title = "未命名视频"
+        # 文件名带上aweme_id，重名视频不会互相覆盖，重新扫描目录时也能识别
+        file_path = os.path.join(self.save_path, f"{safe_title}_{self.task_id}.mp4")
+        return file_path, file_path + ".tmp"
+
+    @staticmethod
+    def _parse_content_range(value):
+        """解析 'bytes start-end/total'，返回 (start, total)，无法解析时返回 (None, None)"""
+        match = re.match(r'bytes\s+(\d+)-\d+/(\d+|\*)', value or '')
+        if not match:
+            return None, None
+        total = int(match.group(2)) if match.group(2) != '*' else None
+        return int(match.group(1)), total
+
+    def _open_stream(self, offset, head_response=None):
+        """从offset处请求视频数据"""
+        headers = {'Range': f'bytes={offset}-'}
+        if offset and self.etag:
+            # 资源已变化时服务器会返回完整内容而不是206
+            headers['If-Range'] = self.etag
+
+        # 首先发送HEAD请求检查资源
+        if head_response is None:
+            head_response = http_pool.head(self.url, allow_redirects=True)
+        if head_response.status_code == 403:
+            # HEAD被拒绝时部分CDN仍允许GET
+            self.status_updated.emit(self.task_id, "访问被拒绝，尝试其他方式...")
+        return http_pool.get(self.url, headers=headers, stream=True, allow_redirects=True)
+
     def _download(self):
         try:
-            # 设置请求头，模拟浏览器行为
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': '*/*',
-                'Accept-Encoding': 'identity;q=1, *;q=0',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'Range': 'bytes=0-',
-                'Referer': 'https://www.douyin.com/',
-                'Origin': 'https://www.douyin.com',
-                'Sec-Fetch-Dest': 'video',
-                'Sec-Fetch-Mode': 'cors',
-                'Sec-Fetch-Site': 'cross-site'
-            }
+            self.status_updated.emit(self.task_id, "下载中")
 
-            # 首先发送HEAD请求检查资源
-            head_response = requests.head(self.url, headers=headers, allow_redirects=True)
-            if head_response.status_code == 403:
-                self.status_updated.emit(self.task_id, "访问被拒绝，尝试其他方式...")
-                # 如果直接访问被拒绝，尝试使用session
-                session = requests.Session()
-                session.headers.update(headers)
-                self.response = session.get(self.url, stream=True, allow_redirects=True)
-            else:
-                self.response = requests.get(self.url, headers=headers, stream=True, allow_redirects=True)
+            # 确保下载目录存在
+            os.makedirs(self.save_path, exist_ok=True)
+            file_path, temp_file_path = self._target_paths()
+
+            for index, url in enumerate(self.mirrors):
+                self.url = url
+                try:
+                    self._download_from(file_path, temp_file_path)
+                    mirror_stats.record(url, ok=True)
+                    return
+                except Exception as e:
+                    if self.is_paused or self.is_cancelled:
+                        raise
+                    mirror_stats.record(url, ok=False)
+                    if index == len(self.mirrors) - 1:
+                        raise
+                    # 临时文件保留，下一个镜像从断点继续
+                    download_log.warning("镜像下载失败，切换到下一个镜像: %s", e,
+                                         extra={'task_id': self.task_id, 'host': mirror_stats.host(url)})
+                    self.status_updated.emit(self.task_id, "切换镜像...")
+                    if self.response is not None:
+                        self.response.close()
+                        self.response = None
 
-            # 检查是否重定向到了新的URL
-            final_url = self.response.url
-            if final_url != self.url:
-                print(f"重定向到: {final_url}")
+        except Exception as e:
+            if self.is_paused:
+                self.status_updated.emit(self.task_id, "已暂停")
+                return
+            self.last_error = e
+            error_msg = f"错误: {str(e)}"
+            download_log.warning("下载出错: %s", e, extra={'task_id': self.task_id})
+            self.status_updated.emit(self.task_id, error_msg)
+            self.download_finished.emit(self.task_id, False)
+        finally:
+            if hasattr(self, 'response') and self.response:
+                self.response.close()
+            if self.thread and self.thread.isRunning():
+                self.thread.quit()
 
-            # 获取文件大小
-            self.total_size = int(self.response.headers.get('content-length', 0))
-            
-            if self.response.status_code not in [200, 206]:
-                error_msg = f"下载失败: HTTP {self.response.status_code}"
-                print(f"下载错误: {error_msg}")
-                print(f"响应头: {self.response.headers}")
-                self.status_updated.emit(self.task_id, error_msg)
-                self.download_finished.emit(self.task_id, False)
+    def _download_from(self, file_path, temp_file_path):
+        """从当前镜像self.url下载，失败时抛出异常由调用方切换镜像"""
+        head_response = http_pool.head(self.url, allow_redirects=True)
+        mirror_stats.record(self.url, latency=head_response.elapsed.total_seconds())
+        if self._use_segments(head_response):
+            self._download_segmented(head_response, temp_file_path, file_path)
+            return
+
+        # 已有临时文件时从其末尾继续下载
+        offset = os.path.getsize(temp_file_path) if os.path.exists(temp_file_path) else 0
+        if offset and self.total_size and offset > self.total_size:
+            offset = 0  # 临时文件比资源还大，说明已损坏
+        state_path = temp_file_path + ".parts"
+        if os.path.exists(state_path):
+            # 之前是分段下载的预分配文件，长度不代表已下载的数据
+            os.remove(state_path)
+            offset = 0
+
+        self.response = self._open_stream(offset, head_response)
+
+        # 检查是否重定向到了新的URL
+        final_url = self.response.url
+        if final_url != self.url:
+            download_log.debug("重定向到: %s", final_url, extra={'task_id': self.task_id})
+
+        if self.response.status_code == 416 and offset:
+            # 请求范围超出资源大小：临时文件可能已经完整
+            _, total = self._parse_content_range(self.response.headers.get('content-range'))
+            self.response.close()
+            if total is not None and total == offset:
+                self.total_size = total
+                self.current_size = offset
+                self._finish_file(temp_file_path, file_path)
                 return
+            offset = 0
+            self.response = self._open_stream(0)
+
+        if self.response.status_code not in [200, 206]:
+            download_log.debug("响应头: %s", self.response.headers, extra={'task_id': self.task_id})
+            raise DownloadError(f"下载失败: HTTP {self.response.status_code}", self.response.status_code,
+                                parse_retry_after(self.response.headers.get('retry-after')))
+
+        etag = self.response.headers.get('etag')
+        if self.response.status_code == 206:
+            start, total = self._parse_content_range(self.response.headers.get('content-range'))
+            length = int(self.response.headers.get('content-length', 0))
+            valid = start == offset
+            if valid and offset and self.etag and etag and etag != self.etag:
+                valid = False  # 资源已变化，不能拼接旧数据
+            if valid and offset and self.total_size and total and total != self.total_size:
+                valid = False
+            if not valid:
+                # 范围与临时文件不一致，从头重新下载
+                self.response.close()
+                offset = 0
+                self.response = self._open_stream(0)
+                start, total = self._parse_content_range(self.response.headers.get('content-range'))
+                length = int(self.response.headers.get('content-length', 0))
+                etag = self.response.headers.get('etag')
+            self.total_size = total or (offset + length if length else 0)
+        else:
+            # 服务器忽略了Range请求，只能从头开始
+            if offset:
+                download_log.info("服务器不支持断点续传，重新下载", extra={'task_id': self.task_id})
+            offset = 0
+            self.total_size = int(self.response.headers.get('content-length', 0))
+        self.etag = etag
 
-            if self.total_size == 0:
-                self.status_updated.emit(self.task_id, "无法获取文件大小，尝试继续下载...")
+        if self.total_size == 0:
+            self.status_updated.emit(self.task_id, "无法获取文件大小，尝试继续下载...")
 
-            # 确保下载目录存在
-            os.makedirs(self.save_path, exist_ok=True)
-            
-            # 处理文件名中的非法字符
-            safe_title = "".join(c for c in self.title if c.isalnum() or c in (' ', '-', '_')).strip()
-            if not safe_title:
-                safe_title = "未命名视频"
-            
-            file_path = os.path.join(self.save_path, f"{safe_title}.mp4")
-            temp_file_path = file_path + ".tmp"
-            
-            self.current_size = 0
-            chunk_size = 1024 * 1024  # 使用1MB的块大小
+        self.current_size = offset
+        chunk_size = self._chunk_size(1024 * 1024)  # 不限速时使用1MB的块大小
+        log_chunks = download_log.isEnabledFor(logging.DEBUG)  # 逐块日志默认关闭，循环里不重复判断级别
+
+        try:
+            with open(temp_file_path, 'ab' if offset else 'wb') as f:
+                for chunk in self.response.iter_content(chunk_size=chunk_size):
+                    if self.is_cancelled:
+                        self.status_updated.emit(self.task_id, "已取消")
+                        self.download_finished.emit(self.task_id, False)
+                        f.close()
+                        if os.path.exists(temp_file_path):
+                            os.remove(temp_file_path)
+                        return
+                    
+                    if self.is_paused:
+                        # 保留临时文件，继续时从断点下载
+                        self.status_updated.emit(self.task_id, "已暂停")
+                        return
+
+                    if chunk:
+                        f.write(chunk)
+                        self.current_size += len(chunk)
+                        if log_chunks:
+                            download_log.debug("已写入 %d/%d 字节", self.current_size, self.total_size,
+                                               extra={'task_id': self.task_id})
+                        self._report_progress()
+                        self._throttle(len(chunk))
 
+        except Exception as e:
+            if self.is_paused:
+                # 暂停时关闭连接会打断读取，这不是错误
+                self.status_updated.emit(self.task_id, "已暂停")
+                return
+            # 保留已下载的临时文件，重试时可以断点续传
+            download_log.warning("写入文件时出错: %s", e, extra={'task_id': self.task_id})
+            raise
+
+        if self.is_paused:
+            # 没有Content-Length时，被暂停打断的读取会像正常结束一样返回
+            self.status_updated.emit(self.task_id, "已暂停")
+            return
+        self._finish_file(temp_file_path, file_path)
+
+    def _use_segments(self, head_response):
+        """仅当服务器支持Range且文件足够大时才启用分段下载"""
+        if self.segments <= 1 or head_response.status_code != 200:
+            return False
+        if head_response.headers.get('accept-ranges', '').lower() != 'bytes':
+            return False
+        total = int(head_response.headers.get('content-length', 0))
+        return total >= max(self.segment_threshold, self.segments)
+
+    def _load_segment_state(self, state_path, total, etag):
+        """读取分段进度，资源大小或ETag不一致时返回None"""
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('total') != total or state.get('etag') != etag:
+            return None
+        return state
+
+    def _save_segment_state(self, state_path, state):
+        # 各分段线程共用同一个 .new 临时文件，写入和替换必须在同一把锁内完成
+        with self.segment_lock:
+            with open(state_path + ".new", 'w', encoding='utf-8') as f:
+                f.write(json.dumps(state))
+            os.replace(state_path + ".new", state_path)
+
+    def _download_segmented(self, head_response, temp_file_path, file_path):
+        """把文件切成多个字节范围并行下载，按位置写入预分配的临时文件"""
+        total = int(head_response.headers.get('content-length', 0))
+        etag = head_response.headers.get('etag')
+        # 各分段分散到不同镜像，某个镜像失败时该分段改用下一个
+        urls = [head_response.url or self.url] + [m for m in self.mirrors if m != self.url]
+        state_path = temp_file_path + ".parts"
+
+        state = None
+        if os.path.exists(temp_file_path) and os.path.getsize(temp_file_path) == total:
+            state = self._load_segment_state(state_path, total, etag)
+        if state is None:
+            # 每段记录 [起始位置, 结束位置(含), 已下载字节数]
+            size = -(-total // self.segments)
+            state = {
+                'total': total,
+                'etag': etag,
+                'segments': [[start, min(start + size, total) - 1, 0] for start in range(0, total, size)]
+            }
+            with open(temp_file_path, 'wb') as f:
+                f.truncate(total)  # 预分配文件
+            self._save_segment_state(state_path, state)
+
+        self.total_size = total
+        self.etag = etag
+        self.current_size = sum(seg[2] for seg in state['segments'])
+        self._report_progress(force=True)
+
+        pending = [seg for seg in state['segments'] if seg[0] + seg[2] <= seg[1]]
+        with ThreadPoolExecutor(max_workers=self.segments) as pool:
+            futures = [pool.submit(self._download_segment, urls, index, seg, temp_file_path, state_path, state)
+                       for index, seg in enumerate(pending)]
+            errors = [future.exception() for future in futures]
+        self._save_segment_state(state_path, state)
+
+        if self.is_cancelled:
+            self.status_updated.emit(self.task_id, "已取消")
+            self.download_finished.emit(self.task_id, False)
+            for path in (temp_file_path, state_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+        if self.is_paused:
+            self.status_updated.emit(self.task_id, "已暂停")
+            return
+        errors = [e for e in errors if e is not None]
+        if errors:
+            # 分段进度已保存，重新开始时只下载未完成的部分
+            raise errors[0]
+
+        os.remove(state_path)
+        self._finish_file(temp_file_path, file_path)
+
+    def _download_segment(self, urls, mirror_index, seg, temp_file_path, state_path, state, max_attempts=3):
+        """下载单个分段，失败时只重试该分段，每次重试换一个镜像"""
+        last_save = time.monotonic()
+        for attempt in range(max(max_attempts, len(urls))):
+            url = urls[(mirror_index + attempt) % len(urls)]
+            start = seg[0] + seg[2]
+            if start > seg[1]:
+                return
+            seg_headers = {'Range': f'bytes={start}-{seg[1]}'}
+            if self.etag:
+                seg_headers['If-Range'] = self.etag
+            response = None
             try:
-                with open(temp_file_path, 'wb') as f:
-                    for chunk in self.response.iter_content(chunk_size=chunk_size):
-                        if self.is_cancelled:
-                            self.status_updated.emit(self.task_id, "已取消")
-                            self.download_finished.emit(self.task_id, False)
-                            if os.path.exists(temp_file_path):
-                                os.remove(temp_file_path)
+                response = http_pool.get(url, headers=seg_headers, stream=True, allow_redirects=True)
+                with self.segment_lock:
+                    self.segment_responses.add(response)
+                if response.status_code != 206:
+                    raise DownloadError(f"分段请求失败: HTTP {response.status_code}", response.status_code,
+                                        parse_retry_after(response.headers.get('retry-after')))
+                with open(temp_file_path, 'r+b') as f:
+                    f.seek(start)
+                    for chunk in response.iter_content(chunk_size=self._chunk_size(256 * 1024)):
+                        if self.is_cancelled or self.is_paused:
                             return
-                        
-                        if self.is_paused:
-                            self.status_updated.emit(self.task_id, "已暂停")
-                            return
-
-                        if chunk:
-                            f.write(chunk)
+                        if not chunk:
+                            continue
+                        chunk = chunk[:seg[1] + 1 - (seg[0] + seg[2])]
+                        f.write(chunk)
+                        with self.segment_lock:
+                            seg[2] += len(chunk)
                             self.current_size += len(chunk)
-                            if self.total_size > 0:
-                                progress = (self.current_size / self.total_size) * 100
-                                print(f"下载进度: {progress:.2f}%")
-                            self.progress_updated.emit(self.task_id, self.current_size, self.total_size)
-
-                # 下载完成后，将临时文件重命名为正式文件
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                os.rename(temp_file_path, file_path)
-                
-                self.status_updated.emit(self.task_id, "已完成")
-                self.download_finished.emit(self.task_id, True)
-
+                        self._report_progress()
+                        self._throttle(len(chunk))
+                        if time.monotonic() - last_save > 1.0:
+                            self._save_segment_state(state_path, state)
+                            last_save = time.monotonic()
+                if seg[0] + seg[2] > seg[1]:
+                    mirror_stats.record(url, ok=True)
+                    return
             except Exception as e:
-                print(f"写入文件时出错: {str(e)}")
+                if self.is_cancelled or self.is_paused:
+                    return
+                mirror_stats.record(url, ok=False)
+                download_log.warning("分段 %d-%d 第%d次下载失败: %s", seg[0], seg[1], attempt + 1, e,
+                                     extra={'task_id': self.task_id, 'host': mirror_stats.host(url)})
+                if attempt == max(max_attempts, len(urls)) - 1:
+                    raise
+            finally:
+                if response is not None:
+                    with self.segment_lock:
+                        self.segment_responses.discard(response)
+                    response.close()
+        raise IOError(f"分段 {seg[0]}-{seg[1]} 下载不完整")
+
+    def _report_progress(self, force=False):
+        """限制进度信号的频率，避免每个数据块都向界面发送一次信号"""
+        now = time.monotonic()
+        if not force and now - self.last_progress_emit < PROGRESS_EMIT_INTERVAL:
+            return
+        self.last_progress_emit = now
+        self.progress_updated.emit(self.task_id, self.current_size, self.total_size)
+
+    def _finish_file(self, temp_file_path, file_path, content_hash=None):
+        """下载完成后，将临时文件重命名为正式文件；content_hash为None时在这里计算摘要"""
+        if self.total_size and self.current_size < self.total_size:
+            raise IOError(f"文件不完整: {self.current_size}/{self.total_size}")
+        self._report_progress(force=True)
+        self.content_hash = content_hash or file_digest(temp_file_path)
+        os.replace(temp_file_path, file_path)
+        self.file_path = file_path
+        self.is_completed = True
+        self.etag = None
+        self.status_updated.emit(self.task_id, "已完成")
+        self.download_finished.emit(self.task_id, True)
+
+class AsyncDownloadLoop:
+    """运行在单个后台线程里的事件循环，所有协程下载任务共用它和同一个aiohttp会话"""
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, limit_per_host=32):
+        self.limit_per_host = limit_per_host
+        self.session = None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name="download-loop", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def get_session(self):
+        if self.session is None:
+            load_aiohttp()
+            connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.limit_per_host)
+            timeout = aiohttp.ClientTimeout(sock_connect=10, sock_read=30)
+            self.session = aiohttp.ClientSession(headers=BROWSER_HEADERS, connector=connector,
+                                                 timeout=timeout, auto_decompress=False)
+        return self.session
+
+class AsyncDownloadTask(DownloadTask):
+    """以协程方式在共享事件循环上运行的下载任务，信号和控制接口与DownloadTask相同
+
+    不占用独立线程；暂不支持分段模式，大文件同样使用单连接断点续传。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.future = None
+
+    def start(self):
+        if self.future is not None and not self.future.done():
+            if not self.is_paused:
+                return
+            # 等待上一次暂停的协程退出后再重新开始
+            concurrent.futures.wait([self.future], timeout=5)
+        self.is_paused = False
+        self.is_cancelled = False
+        self.last_error = None
+        self.future = AsyncDownloadLoop.instance().submit(self._download_async())
+
+    def pause(self):
+        self.is_paused = True
+        self._cancel_future()
+
+    def cancel(self):
+        self.is_cancelled = True
+        if self.future is not None and not self.future.done():
+            self._cancel_future()  # 运行中的协程在处理CancelledError时删除临时文件
+        else:
+            self._remove_temp_files()
+
+    def cleanup(self):
+        if self.future is not None and not self.future.done():
+            self.pause()
+            concurrent.futures.wait([self.future], timeout=5)
+
+    def _cancel_future(self):
+        if self.future is not None and not self.future.done():
+            self.future.cancel()
+
+    async def _download_async(self):
+        file_path, temp_file_path = self._target_paths()
+        try:
+            self.status_updated.emit(self.task_id, "下载中")
+            os.makedirs(self.save_path, exist_ok=True)
+
+            session = await AsyncDownloadLoop.instance().get_session()
+            for index, url in enumerate(self.mirrors):
+                self.url = url
+                try:
+                    await self._download_async_from(session, file_path, temp_file_path)
+                    mirror_stats.record(url, ok=True)
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    mirror_stats.record(url, ok=False)
+                    if index == len(self.mirrors) - 1:
+                        raise
+                    download_log.warning("镜像下载失败，切换到下一个镜像: %s", e,
+                                         extra={'task_id': self.task_id, 'host': mirror_stats.host(url)})
+                    self.status_updated.emit(self.task_id, "切换镜像...")
+
+        except asyncio.CancelledError:
+            if self.is_cancelled:
+                self.status_updated.emit(self.task_id, "已取消")
+                self.download_finished.emit(self.task_id, False)
                 if os.path.exists(temp_file_path):
                     os.remove(temp_file_path)
-                raise
-
+            else:
+                # 保留临时文件，继续时从断点下载
+                self.status_updated.emit(self.task_id, "已暂停")
         except Exception as e:
+            self.last_error = e
             error_msg = f"错误: {str(e)}"
-            print(f"下载出错: {error_msg}")
+            download_log.warning("下载出错: %s", e, extra={'task_id': self.task_id})
             self.status_updated.emit(self.task_id, error_msg)
             self.download_finished.emit(self.task_id, False)
-        finally:
-            if hasattr(self, 'response') and self.response:
-                self.response.close()
-            if self.thread.isRunning():
-                self.thread.quit()
+
+    async def _throttle_async(self, size):
+        """协程版限速：在事件循环里等待，不阻塞其他任务"""
+        for bucket in (self.bandwidth, global_bandwidth):
+            while True:
+                wait = bucket.try_consume(size)
+                if not wait:
+                    break
+                await asyncio.sleep(min(wait, 0.5))  # 分段等待，及时响应速率调整
+
+    async def _download_async_from(self, session, file_path, temp_file_path):
+        """从当前镜像self.url下载，失败时抛出异常由调用方切换镜像"""
+        offset = os.path.getsize(temp_file_path) if os.path.exists(temp_file_path) else 0
+        state_path = temp_file_path + ".parts"
+        if os.path.exists(state_path):
+            # 线程引擎留下的分段预分配文件，无法按长度续传
+            os.remove(state_path)
+            offset = 0
+
+        for _ in range(2):
+            headers = {'Range': f'bytes={offset}-'}
+            if offset and self.etag:
+                headers['If-Range'] = self.etag
+            started = time.monotonic()
+            async with session.get(self.url, headers=headers) as response:
+                mirror_stats.record(self.url, latency=time.monotonic() - started)
+                if response.status == 416 and offset:
+                    _, total = self._parse_content_range(response.headers.get('Content-Range'))
+                    if total is not None and total == offset:
+                        self.total_size = total
+                        self.current_size = offset
+                        await self._finish_file_async(temp_file_path, file_path)
+                        return
+                    offset = 0
+                    continue
+
+                if response.status not in [200, 206]:
+                    raise DownloadError(f"下载失败: HTTP {response.status}", response.status,
+                                        parse_retry_after(response.headers.get('Retry-After')))
+
+                etag = response.headers.get('ETag')
+                length = response.content_length or 0
+                if response.status == 206:
+                    start, total = self._parse_content_range(response.headers.get('Content-Range'))
+                    valid = start == offset
+                    if valid and offset and self.etag and etag and etag != self.etag:
+                        valid = False
+                    if not valid and offset:
+                        offset = 0  # 范围与临时文件不一致，从头重新下载
+                        continue
+                    if not valid:
+                        raise IOError("服务器返回的数据范围不正确")
+                    self.total_size = total or (offset + length if length else 0)
+                else:
+                    if offset:
+                        download_log.info("服务器不支持断点续传，重新下载", extra={'task_id': self.task_id})
+                    offset = 0
+                    self.total_size = length
+                self.etag = etag
+
+                self.current_size = offset
+                with open(temp_file_path, 'ab' if offset else 'wb') as f:
+                    async for chunk in response.content.iter_chunked(self._chunk_size(256 * 1024)):
+                        f.write(chunk)
+                        self.current_size += len(chunk)
+                        self._report_progress()
+                        await self._throttle_async(len(chunk))
+
+                await self._finish_file_async(temp_file_path, file_path)
+                return
+        raise IOError("无法从断点继续下载")
+
+    async def _finish_file_async(self, temp_file_path, file_path):
+        """在线程池中计算摘要，重新读取整个文件时不阻塞共享事件循环上的其他下载"""
+        if self.total_size and self.current_size < self.total_size:
+            raise IOError(f"文件不完整: {self.current_size}/{self.total_size}")
+        content_hash = await asyncio.get_running_loop().run_in_executor(None, file_digest, temp_file_path)
+        self._finish_file(temp_file_path, file_path, content_hash)
+
+# 可选的下载引擎：thread为每个任务一个线程，asyncio为共享事件循环上的协程（需要aiohttp）
+DOWNLOAD_BACKENDS = {
+    'thread': DownloadTask,
+    'asyncio': AsyncDownloadTask,
+}
+
+class ProgressAggregator(QObject):
+    """在主线程汇总各任务的进度，按固定帧率批量通知界面，并计算速度和剩余时间"""
+    progress_batch = pyqtSignal(list)  # [(task_id, current, total, bytes_per_sec, eta_seconds), ...]
+
+    def __init__(self, interval_ms=100, window=3.0):
+        super().__init__()
+        self.window = window  # 计算速度所用的采样时间窗口（秒）
+        self.latest = {}  # task_id -> (current, total)
+        self.samples = {}  # task_id -> deque[(time, current)]
+        self.dirty = set()
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.flush)
+
+    def record(self, task_id, current, total):
+        now = time.monotonic()
+        samples = self.samples.setdefault(task_id, deque())
+        if samples and current < samples[-1][1]:
+            samples.clear()  # 重新开始下载，旧样本作废
+        samples.append((now, current))
+        while len(samples) > 2 and now - samples[0][0] > self.window:
+            samples.popleft()
+        self.latest[task_id] = (current, total)
+        self.dirty.add(task_id)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def rate(self, task_id):
+        samples = self.samples.get(task_id)
+        if not samples or len(samples) < 2:
+            return 0.0
+        elapsed = samples[-1][0] - samples[0][0]
+        if elapsed <= 0:
+            return 0.0
+        return (samples[-1][1] - samples[0][1]) / elapsed
+
+    def discard(self, task_id):
+        self.latest.pop(task_id, None)
+        self.samples.pop(task_id, None)
+        self.dirty.discard(task_id)
+
+    def flush(self):
+        if not self.dirty:
+            self.timer.stop()
+            return
+        batch = []
+        for task_id in self.dirty:
+            if task_id not in self.latest:
+                continue
+            current, total = self.latest[task_id]
+            rate = self.rate(task_id)
+            eta = (total - current) / rate if rate > 0 and total > current else None
+            batch.append((task_id, current, total, rate, eta))
+        self.dirty.clear()
+        if batch:
+            self.progress_batch.emit(batch)
+
+class BloomFilter:
+    """布隆过滤器，用很小的内存记录大量历史aweme_id，可能误判为存在，但不会漏判"""
+
+    def __init__(self, capacity=1_000_000, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def save(self, path):
+        with open(path + ".new", 'wb') as f:
+            f.write(struct.pack('<QI', self.size, self.hash_count))
+            f.write(self.bits)
+        os.replace(path + ".new", path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            size, hash_count = struct.unpack('<QI', f.read(12))
+            bits = bytearray(f.read())
+        if len(bits) != (size + 7) // 8:
+            raise ValueError("布隆过滤器文件已损坏")
+        bloom = cls.__new__(cls)
+        bloom.size, bloom.hash_count, bloom.bits = size, hash_count, bits
+        return bloom
+
+class SeenIndex:
+    """提取器、界面和下载管理器共用的aweme_id去重集合（线程安全）
+
+    ids 记录当前已在下载中心的视频；可选的布隆过滤器持久化保存历史上下载完成的视频，
+    用来在查询已完成索引之前快速排除从未下载过的视频。
+    """
+
+    def __init__(self, bloom_path=None):
+        self.ids = set()
+        self.lock = threading.Lock()
+        self.bloom_path = bloom_path
+        self.bloom = None
+        if bloom_path:
+            try:
+                self.bloom = BloomFilter.load(bloom_path)
+            except (OSError, ValueError, struct.error):
+                self.bloom = BloomFilter()
+
+    def add(self, aweme_id):
+        """加入集合，之前不存在时返回True"""
+        with self.lock:
+            if aweme_id in self.ids:
+                return False
+            self.ids.add(aweme_id)
+            return True
+
+    def __contains__(self, aweme_id):
+        return aweme_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def discard(self, aweme_id):
+        with self.lock:
+            self.ids.discard(aweme_id)
+
+    def clear(self):
+        with self.lock:
+            self.ids.clear()
+
+    def archive(self, aweme_id):
+        """记录为历史上下载完成过的视频"""
+        if self.bloom is not None:
+            with self.lock:
+                self.bloom.add(aweme_id)
+
+    def maybe_archived(self, aweme_id):
+        """没有布隆过滤器时总是返回True，由调用方继续精确查询"""
+        return self.bloom is None or aweme_id in self.bloom
+
+    def save(self):
+        if self.bloom is not None and self.bloom_path:
+            with self.lock:
+                self.bloom.save(self.bloom_path)
+
+class TaskStore:
+    """下载任务的SQLite持久化存储（WAL模式），程序关闭或崩溃后可以恢复下载队列"""
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    aweme_id TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    metadata TEXT NOT NULL DEFAULT '{}',
+                    save_path TEXT NOT NULL,
+                    temp_path TEXT,
+                    status TEXT NOT NULL DEFAULT '等待中',
+                    bytes_done INTEGER NOT NULL DEFAULT 0,
+                    total_bytes INTEGER NOT NULL DEFAULT 0,
+                    etag TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS completed (
+                    aweme_id TEXT PRIMARY KEY,
+                    file_path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    content_hash TEXT,
+                    completed_at REAL NOT NULL
+                )
+            """)
+
+    def upsert_task(self, aweme_id, url, title, metadata, save_path, temp_path):
+        """新增任务；任务已存在时只更新链接和元数据，保留状态和进度"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute("""
+                INSERT INTO tasks (aweme_id, url, title, metadata, save_path, temp_path, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(aweme_id) DO UPDATE SET
+                    url = excluded.url, title = excluded.title, metadata = excluded.metadata,
+                    updated_at = excluded.updated_at
+            """, (aweme_id, url, title, json.dumps(metadata or {}, ensure_ascii=False),
+                  save_path, temp_path, now, now))
+
+    def update_state(self, aweme_id, status, bytes_done, total_bytes, etag=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE tasks SET status = ?, bytes_done = ?, total_bytes = ?, etag = ?, updated_at = ? "
+                "WHERE aweme_id = ?",
+                (status, bytes_done, total_bytes, etag, time.time(), aweme_id))
+
+    def update_progress_many(self, rows):
+        """批量写入进度，rows为 [(aweme_id, bytes_done, total_bytes), ...]"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "UPDATE tasks SET bytes_done = ?, total_bytes = ?, updated_at = ? WHERE aweme_id = ?",
+                [(done, total, now, aweme_id) for aweme_id, done, total in rows])
+
+    def delete_task(self, aweme_id):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM tasks WHERE aweme_id = ?", (aweme_id,))
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM tasks")
+
+    def load_tasks(self):
+        """按添加顺序返回所有任务"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "SELECT aweme_id, url, title, metadata, save_path, temp_path, status, bytes_done, "
+                "total_bytes, etag FROM tasks ORDER BY created_at")
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        for row in rows:
+            try:
+                row['metadata'] = json.loads(row['metadata'])
+            except ValueError:
+                row['metadata'] = {}
+        return rows
+
+    def mark_completed(self, aweme_id, file_path, size, content_hash=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO completed (aweme_id, file_path, size, content_hash, completed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (aweme_id, file_path, size, content_hash, time.time()))
+
+    def get_completed(self, aweme_id):
+        """返回 (file_path, size, content_hash)，未下载过时返回None"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT file_path, size, content_hash FROM completed WHERE aweme_id = ?",
+                (aweme_id,)).fetchone()
+
+    def sync_completed_directory(self, directory, found):
+        """用目录扫描结果更新已完成索引，found为 {aweme_id: (file_path, size)}"""
+        directory = os.path.abspath(directory)
+        with self.lock, self.conn:
+            known = {row[0]: (row[1], row[2]) for row in self.conn.execute(
+                "SELECT aweme_id, file_path, size FROM completed")}
+            # 文件已被删除或移走的记录
+            stale = [aweme_id for aweme_id, (path, _) in known.items()
+                     if os.path.dirname(os.path.abspath(path)) == directory and aweme_id not in found]
+            self.conn.executemany("DELETE FROM completed WHERE aweme_id = ?", [(a,) for a in stale])
+            now = time.time()
+            # 新发现或大小有变化的文件，摘要在需要时再计算
+            changed = [(aweme_id, path, size, None, now) for aweme_id, (path, size) in found.items()
+                       if known.get(aweme_id) != (path, size)]
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO completed (aweme_id, file_path, size, content_hash, completed_at) "
+                "VALUES (?, ?, ?, ?, ?)", changed)
+        return len(changed), len(stale)
+
+    def completed_ids(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT aweme_id FROM completed")]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def open_task_store():
+    """打开任务数据库和已下载索引，返回 (TaskStore, SeenIndex)"""
+    store = TaskStore(os.path.join(APP_DATA_DIR, "tasks.db"))
+    seen = SeenIndex(os.path.join(APP_DATA_DIR, "downloaded.bloom"))
+    # 布隆过滤器只在正常退出时保存，崩溃前完成的视频不在文件里；
+    # 每次都用completed表补齐，过滤器不会对已完成的视频给出"不存在"
+    for aweme_id in store.completed_ids():
+        seen.archive(aweme_id)
+    return store, seen
+
+# 这些状态码通常表示带签名的播放地址已过期
+URL_EXPIRED_STATUSES = {403, 410}
+
+# 任务数据库只保存这几种状态；"切换镜像..."、"3秒后重试"等提示文字只在界面上显示，
+# 否则崩溃后恢复时无法判断任务原本是否在下载
+TASK_STATES = ("等待中", "排队中", "下载中", "已暂停", "下载失败", "已完成")
 
 class DownloadManager(QObject):
-    def __init__(self, default_save_path):
+    """管理下载任务，并按并发上限调度排队中的任务"""
+    url_refresh_needed = pyqtSignal(str)  # 链接已过期、需要重新获取播放地址的aweme_id
+
+    def __init__(self, default_save_path, max_concurrent=5, per_host_limit=3, segments=1,
+                 segment_threshold=8 * 1024 * 1024, backend='thread', store=None, seen=None,
+                 retry_policy=None):
         super().__init__()
         self.tasks = {}
+        self.seen = seen if seen is not None else SeenIndex()  # 与提取器、界面共用的去重集合
+        self.store = store  # TaskStore，为None时不持久化
+        self.progress_dirty = set()  # 进度有变化、尚未写入数据库的任务ID
+        self.store_timer = QTimer(self)
+        self.store_timer.setInterval(5000)
+        self.store_timer.timeout.connect(self.flush_progress_to_store)
         self.default_save_path = default_save_path
+        self.backend = 'thread'
+        self.set_backend(backend)
+        self.segments = segments  # 大文件分段下载的连接数，1表示关闭分段模式
+        self.segment_threshold = segment_threshold
+        self.max_concurrent = max_concurrent  # 同时下载的任务上限
+        self.per_host_limit = per_host_limit  # 每个CDN主机同时下载的上限，0表示不限制
+        self.host_queues = {}  # host -> 排队堆: (priority, seq, task_id)，priority越小越先开始
+        self.pending = []  # 可以启动任务的主机堆: (priority, seq, host)，取自该主机排在最前的任务
+        self.host_heads = {}  # host -> 该主机在pending中有效项的(priority, seq)，其余为过期项
+        self.queued = {}  # 仍在排队中的任务ID -> (priority, seq)，用于惰性删除堆中的过期项
+        self.active = set()  # 正在占用下载槽位的任务ID
+        self.active_hosts = {}  # task_id -> 占用的主机，任务切换镜像后仍按原主机释放
+        self.host_active = {}  # host -> 正在下载的任务数
+        self.progress_aggregator = ProgressAggregator()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retry_attempts = {}  # task_id -> 已自动重试的次数
+        self.retry_timers = {}  # task_id -> 等待重试的定时器，等待期间不占用下载槽位
+        self.refreshing = set()  # 正在等待刷新播放地址的任务ID
+        self.refreshed_ids = set()  # 本轮已刷新过地址的任务ID，避免反复刷新
+        self._seq = itertools.count()
         if not os.path.exists(default_save_path):
             os.makedirs(default_save_path)
 
-    def add_task(self, url, title, aweme_id):
+    def add_task(self, url, title, aweme_id, metadata=None, save_path=None, mirrors=None):
         """使用视频的aweme_id作为唯一的task_id来创建下载任务"""
         if not aweme_id:  # 安全回退，以防aweme_id为空
             aweme_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
@@ -354,11 +1539,18 @@ class DownloadManager(QObject):
         task_id = str(aweme_id) # 确保是字符串
 
         if task_id in self.tasks:
-            print(f"任务 {task_id} 已存在于下载管理器中，将不会重复添加。")
+            scheduler_log.debug("任务已存在于下载管理器中，不重复添加", extra={'task_id': task_id})
             return task_id  # 如果任务已存在，直接返回ID
 
-        task = DownloadTask(task_id, url, title, self.default_save_path)
+        self.seen.add(task_id)
+        task_class = DOWNLOAD_BACKENDS[self.backend]
+        task = task_class(task_id, url, title, save_path or self.default_save_path,
+                          segments=self.segments, segment_threshold=self.segment_threshold,
+                          mirrors=mirrors)
         self.tasks[task_id] = task
+        if self.store is not None:
+            self.store.upsert_task(task_id, url, title, metadata, task.save_path, task._target_paths()[1])
+            self._check_completed(task)
         
         # 连接信号
         task.progress_updated.connect(self.handle_progress_update)
@@ -367,48 +1559,552 @@ class DownloadManager(QObject):
         
         return task_id
 
-    def start_task(self, task_id):
-        if task_id in self.tasks:
-            self.tasks[task_id].start()
+    def _check_completed(self, task):
+        """已下载过且文件仍然完整的视频直接标记为完成，不发起任何请求"""
+        if not self.seen.maybe_archived(task.task_id):
+            return  # 布隆过滤器确定从未下载过，无需查询数据库
+        entry = self.store.get_completed(task.task_id)
+        if entry is None:
+            return
+        file_path, size, content_hash = entry
+        try:
+            if os.path.getsize(file_path) != size:
+                return
+        except OSError:
+            return
+        task.is_completed = True
+        task.file_path = file_path
+        task.content_hash = content_hash
+        task.current_size = task.total_size = size
+
+    def is_completed(self, task_id):
+        task = self.tasks.get(task_id)
+        return task is not None and task.is_completed
+
+    def rescan_directory(self, directory=None):
+        """扫描下载目录，按文件名中的aweme_id重建已完成索引，只读取文件大小"""
+        directory = directory or self.default_save_path
+        if self.store is None or not os.path.isdir(directory):
+            return
+        found = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                match = DOWNLOADED_FILE_PATTERN.search(entry.name)
+                if match and entry.is_file():
+                    found[match.group(1)] = (entry.path, entry.stat().st_size)
+        added, removed = self.store.sync_completed_directory(directory, found)
+        for aweme_id in found:
+            self.seen.archive(aweme_id)
+        scheduler_log.info("扫描下载目录: %d 个已下载视频，新增 %d 条，移除 %d 条索引", len(found), added, removed)
+
+    def start_task(self, task_id, priority=0, retry=False):
+        """将任务放入排队队列，有空闲槽位时自动开始"""
+        task = self.tasks.get(task_id)
+        if task is None:
+            return
+        if task.is_completed:
+            # 已下载完成或按索引标记为完成的任务不再发起请求，也不覆盖已有的文件
+            task.status_updated.emit(task_id, "已完成")
+            return
+        if task_id in self.active or task_id in self.queued:
+            return
+        self._stop_retry_timer(task_id)
+        self.refreshing.discard(task_id)
+        if not retry:
+            self.retry_attempts.pop(task_id, None)  # 手动开始时重新计算重试次数
+            self.refreshed_ids.discard(task_id)
+        key = (priority, next(self._seq))
+        self.queued[task_id] = key
+        host = self._task_host(task_id)  # 入队时解析一次主机，调度时不再解析URL
+        heapq.heappush(self.host_queues.setdefault(host, []), key + (task_id,))
+        self._push_host(host)
+        task.status_updated.emit(task_id, "排队中")
+        self.schedule()
 
     def pause_task(self, task_id):
-        if task_id in self.tasks:
+        if self._stop_retry_timer(task_id) or task_id in self.refreshing:
+            self.refreshing.discard(task_id)
+            self.tasks[task_id].status_updated.emit(task_id, "已暂停")
+        elif task_id in self.queued:
+            del self.queued[task_id]
+            self.tasks[task_id].status_updated.emit(task_id, "已暂停")
+        elif task_id in self.tasks:
             self.tasks[task_id].pause()
+            self._release_slot(task_id)
+
+    def pause_all(self):
+        """暂停所有正在下载、排队、等待重试或刷新链接的任务，返回被暂停的任务ID
+
+        先处理未占用槽位的任务，再暂停下载中的任务，释放槽位时不会有排队任务被启动。
+        """
+        waiting = (set(self.queued) | set(self.retry_timers) | self.refreshing) - self.active
+        task_ids = list(waiting) + list(self.active)
+        for task_id in task_ids:
+            self.pause_task(task_id)
+        return task_ids
 
     def resume_task(self, task_id):
-        if task_id in self.tasks:
-            self.tasks[task_id].resume()
+        self.start_task(task_id)
 
     def cancel_task(self, task_id):
         if task_id in self.tasks:
+            self._stop_retry_timer(task_id)
+            self.retry_attempts.pop(task_id, None)
+            self.refreshing.discard(task_id)
+            self.refreshed_ids.discard(task_id)
+            self.queued.pop(task_id, None)
             self.tasks[task_id].cancel()
+            self._release_slot(task_id)
+            self.progress_aggregator.discard(task_id)
+            self.progress_dirty.discard(task_id)
+            self.seen.discard(task_id)
             del self.tasks[task_id]
+            if self.store is not None:
+                self.store.delete_task(task_id)
+
+    def set_max_concurrent(self, value):
+        self.max_concurrent = max(1, int(value))
+        self.schedule()
+
+    def set_backend(self, backend):
+        """切换下载引擎，只对之后添加的任务生效"""
+        if backend not in DOWNLOAD_BACKENDS:
+            raise ValueError(f"未知的下载引擎: {backend}")
+        if backend == 'asyncio' and not AIOHTTP_AVAILABLE:
+            scheduler_log.warning("未安装aiohttp，继续使用线程下载引擎")
+            backend = 'thread'
+        self.backend = backend
+
+    def set_segments(self, value):
+        """设置分段数，对尚未开始下载的任务同样生效"""
+        self.segments = max(1, int(value))
+        for task in self.tasks.values():
+            task.segments = self.segments
+
+    def set_bandwidth_limit(self, kbps):
+        """设置全局限速（KB/s），0表示不限速，正在下载的任务立即生效"""
+        global_bandwidth.set_rate(int(kbps) * 1024)
+
+    def set_task_bandwidth_limit(self, task_id, kbps):
+        """设置单个任务的限速（KB/s），0表示不限速"""
+        task = self.tasks.get(task_id)
+        if task is not None:
+            task.bandwidth.set_rate(int(kbps) * 1024)
+
+    def set_per_host_limit(self, value):
+        self.per_host_limit = max(0, int(value))
+        for host in list(self.host_queues):
+            self._push_host(host)
+        self.schedule()
+
+    def schedule(self):
+        """在不超过全局和单主机上限的前提下，按优先级启动排队中的任务
+
+        每个主机只有排在最前的任务进入pending，已满的主机暂时移出，等它释放槽位时再放回，
+        所以同一主机排队的任务再多，调度也不需要逐个检查。
+        """
+        while self.pending and len(self.active) < self.max_concurrent:
+            priority, seq, host = heapq.heappop(self.pending)
+            if self.host_heads.get(host) != (priority, seq):
+                continue  # 该主机之后有优先级更高的任务入队，这是过期项
+            del self.host_heads[host]
+            queue = self.host_queues.get(host)
+            if not queue or self.queued.get(queue[0][2]) != (priority, seq) or self._host_full(host):
+                self._push_host(host)  # 排在最前的任务已被暂停或取消，或主机已满
+                continue
+            task_id = heapq.heappop(queue)[2]
+            del self.queued[task_id]
+            self.active.add(task_id)
+            self.host_active[host] = self.host_active.get(host, 0) + 1
+            self.active_hosts[task_id] = host
+            self._push_host(host)
+            self.tasks[task_id].start()
+
+    def _push_host(self, host):
+        """把主机排在最前的有效任务放入pending，主机已满时等释放槽位后再放入"""
+        queue = self.host_queues.get(host)
+        while queue and self.queued.get(queue[0][2]) != queue[0][:2]:
+            heapq.heappop(queue)  # 已被暂停、取消或重新排队
+        if not queue:
+            self.host_queues.pop(host, None)
+            self.host_heads.pop(host, None)
+            return
+        key = queue[0][:2]
+        if self._host_full(host) or self.host_heads.get(host) == key:
+            return
+        self.host_heads[host] = key
+        heapq.heappush(self.pending, key + (host,))
+
+    def _host_full(self, host):
+        return bool(self.per_host_limit) and self.host_active.get(host, 0) >= self.per_host_limit
+
+    def _task_host(self, task_id):
+        return urlparse(self.tasks[task_id].url).hostname or ''
+
+    def _release_slot(self, task_id):
+        if task_id not in self.active:
+            return
+        self.active.discard(task_id)
+        host = self.active_hosts.pop(task_id, '')
+        self.host_active[host] = max(0, self.host_active.get(host, 0) - 1)
+        self._push_host(host)
+        self.schedule()
 
     def set_save_path(self, path):
         self.default_save_path = path
         if not os.path.exists(path):
             os.makedirs(path)
+        self.rescan_directory(path)
 
     def handle_progress_update(self, task_id, current, total):
-        # 这个信号会被UI层捕获并更新进度
-        pass
+        # 汇总后由progress_aggregator.progress_batch批量通知UI层
+        self.progress_aggregator.record(task_id, current, total)
+        if self.store is not None:
+            self.progress_dirty.add(task_id)
+            if not self.store_timer.isActive():
+                self.store_timer.start()
 
     def handle_status_update(self, task_id, status):
-        # 这个信号会被UI层捕获并更新状态
-        pass
+        # UI层另行更新显示，这里只持久化TASK_STATES中的状态
+        if status in TASK_STATES:
+            self._save_state(task_id, status)
 
     def handle_download_finished(self, task_id, success):
-        # 这个信号会被UI层捕获并处理下载完成事件
-        pass
+        # 释放下载槽位并启动下一个排队中的任务，UI层另行处理显示
+        task = self.tasks.get(task_id)
+        if not success and task is not None and (self._request_refresh(task) or self._schedule_retry(task)):
+            return
+        self.retry_attempts.pop(task_id, None)
+        self.refreshed_ids.discard(task_id)
+        self._save_state(task_id, "已完成" if success else "下载失败")
+        if success and self.store is not None and task is not None and task.file_path:
+            self.store.mark_completed(task_id, task.file_path, task.total_size or task.current_size,
+                                      task.content_hash)
+            self.seen.archive(task_id)
+        self._release_slot(task_id)
+
+    def _schedule_retry(self, task):
+        """可重试的失败在退避一段时间后重新排队，返回是否已安排重试"""
+        task_id = task.task_id
+        if task.is_cancelled or task.is_paused:
+            return False
+        attempt = self.retry_attempts.get(task_id, 0) + 1
+        if attempt >= self.retry_policy.max_attempts or not self.retry_policy.is_retryable(task.last_error):
+            return False
+        self.retry_attempts[task_id] = attempt
+        delay = self.retry_policy.delay(attempt, task.last_error)
+        self._release_slot(task_id)
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.timeout.connect(lambda: self._retry_now(task_id))
+        timer.start(int(delay * 1000))
+        self.retry_timers[task_id] = timer
+        scheduler_log.info("第%d次重试将在 %.1f 秒后开始: %s", attempt, delay, task.last_error,
+                           extra={'task_id': task_id})
+        task.status_updated.emit(task_id, f"{math.ceil(delay)}秒后重试 ({attempt}/{self.retry_policy.max_attempts - 1})")
+        self._save_state(task_id, "排队中")  # 程序重启后直接恢复排队
+        return True
+
+    def _request_refresh(self, task):
+        """播放地址过期时请求刷新该视频的地址，返回是否已发起刷新"""
+        task_id = task.task_id
+        error = task.last_error
+        if task.is_cancelled or task.is_paused or task_id in self.refreshed_ids:
+            return False
+        if not isinstance(error, DownloadError) or error.status not in URL_EXPIRED_STATUSES:
+            return False
+        if not self.receivers(self.url_refresh_needed):
+            return False  # 没有可用的刷新器，例如未加载浏览器
+        self.refreshing.add(task_id)
+        self.refreshed_ids.add(task_id)
+        self._release_slot(task_id)
+        task.status_updated.emit(task_id, "链接已过期，正在刷新...")
+        self._save_state(task_id, "排队中")
+        self.url_refresh_needed.emit(task_id)
+        return True
+
+    def apply_refreshed_url(self, task_id, video):
+        """刷新完成：换上新的播放地址后重新排队，失败时标记为下载失败"""
+        task = self.tasks.get(task_id)
+        if task is None:
+            return
+        waiting = task_id in self.refreshing
+        self.refreshing.discard(task_id)
+        if video is None:
+            if waiting:
+                # 按一次普通的失败结束任务，界面和命令行模式都会把它计入失败
+                task.download_finished.emit(task_id, False)
+                task.status_updated.emit(task_id, "下载失败: 无法刷新过期的链接")
+            return
+        task.mirrors = mirror_stats.order(list(dict.fromkeys(video.mirrors)))
+        task.url = task.mirrors[0]
+        if self.store is not None:
+            # 保留原标题，文件名不随视频描述的修改而变化
+            self.store.upsert_task(task_id, task.url, task.title, video.to_metadata(),
+                                   task.save_path, task._target_paths()[1])
+        if waiting:
+            self.start_task(task_id, retry=True)
+
+    def _retry_now(self, task_id):
+        timer = self.retry_timers.pop(task_id, None)
+        if timer is not None:
+            timer.deleteLater()
+        self.start_task(task_id, retry=True)
+
+    def _stop_retry_timer(self, task_id):
+        timer = self.retry_timers.pop(task_id, None)
+        if timer is None:
+            return False
+        timer.stop()
+        timer.deleteLater()
+        return True
+
+    def is_retry_pending(self, task_id):
+        return task_id in self.retry_timers or task_id in self.refreshing
+
+    def is_idle(self):
+        """没有正在下载、排队、等待重试或刷新链接的任务"""
+        return not (self.active or self.queued or self.retry_timers or self.refreshing)
+
+    def _save_state(self, task_id, status):
+        task = self.tasks.get(task_id)
+        if self.store is None or task is None:
+            return
+        self.progress_dirty.discard(task_id)
+        self.store.update_state(task_id, status, task.current_size, task.total_size, task.etag)
+
+    def flush_progress_to_store(self):
+        """定时把下载进度批量写入数据库，避免每个进度信号都写一次"""
+        if self.store is None or not self.progress_dirty:
+            self.store_timer.stop()
+            return
+        rows = [(task_id, self.tasks[task_id].current_size, self.tasks[task_id].total_size)
+                for task_id in self.progress_dirty if task_id in self.tasks]
+        self.progress_dirty.clear()
+        self.store.update_progress_many(rows)
+
+    def clear_store(self):
+        self.progress_dirty.clear()
+        if self.store is not None:
+            self.store.clear()
+
+# 画质策略: (名称, 最低短边分辨率, 排序方式, 是否只要H.264)
+#   排序方式 'max' 取画质最高的版本，'min' 取满足分辨率要求的最小文件
+STREAM_POLICIES = {
+    'max_quality': ('最高画质', 0, 'max', False),
+    'smallest_1080p': ('≥1080p 最小体积', 1080, 'min', False),
+    'smallest_720p': ('≥720p 最小体积', 720, 'min', False),
+    'smallest': ('最小体积', 0, 'min', False),
+    'h264_max': ('最高画质 (仅H.264)', 0, 'max', True),
+}
+DEFAULT_STREAM_POLICY = 'max_quality'
+
+def normalize_video_url(url):
+    """补全协议并去掉水印参数"""
+    if not url.startswith('http'):
+        url = 'https:' + url
+    if '&watermark=' in url:
+        url = url.split('&watermark=')[0]
+    return url
+
+def stream_variants(video_info):
+    """列出一个视频的所有可用流，每个流为一个字典"""
+    variants = []
+    for entry in video_info.get('bit_rate') or []:
+        addr = entry.get('play_addr') or {}
+        if not addr.get('url_list'):
+            continue
+        width = addr.get('width') or 0
+        height = addr.get('height') or 0
+        variants.append({
+            'source': 'bit_rate',
+            'url_list': addr['url_list'],
+            'gear_name': entry.get('gear_name', ''),
+            'bitrate': entry.get('bit_rate') or 0,
+            'width': width,
+            'height': height,
+            # 竖屏视频的宽才是"720p"里的720，按短边计算分辨率
+            'resolution': min(width, height) if width and height else max(width, height),
+            'codec': 'h265' if entry.get('is_h265') or entry.get('is_bytevc1') else 'h264',
+            'data_size': addr.get('data_size') or 0,
+        })
+    # bit_rate缺失时回退到play_addr和download_addr，它们没有画质信息
+    for source in ('play_addr', 'download_addr'):
+        addr = video_info.get(source) or {}
+        if addr.get('url_list'):
+            width = addr.get('width') or video_info.get('width') or 0
+            height = addr.get('height') or video_info.get('height') or 0
+            variants.append({
+                'source': source,
+                'url_list': addr['url_list'],
+                'gear_name': '',
+                'bitrate': 0,
+                'width': width,
+                'height': height,
+                'resolution': min(width, height) if width and height else max(width, height),
+                'codec': 'h264',
+                'data_size': addr.get('data_size') or 0,
+            })
+    return variants
+
+def select_stream(video_info, policy=DEFAULT_STREAM_POLICY):
+    """按画质策略在所有流中挑选一个，没有可用流时返回None"""
+    variants = stream_variants(video_info)
+    if not variants:
+        return None
+    _, min_resolution, order, h264_only = STREAM_POLICIES.get(policy, STREAM_POLICIES[DEFAULT_STREAM_POLICY])
+    candidates = variants
+    if h264_only:
+        candidates = [v for v in candidates if v['codec'] == 'h264'] or candidates
+    if min_resolution:
+        # 没有任何流达到要求时退而取分辨率最高的那些
+        enough = [v for v in candidates if v['resolution'] >= min_resolution]
+        if not enough:
+            best = max(v['resolution'] for v in candidates)
+            enough = [v for v in candidates if v['resolution'] == best]
+        candidates = enough
+    # 同等条件下bit_rate优先于play_addr，H.265在同码率下画质更好
+    source_rank = {'bit_rate': 2, 'play_addr': 1, 'download_addr': 0}
+    if order == 'max':
+        key = lambda v: (v['resolution'], v['bitrate'], v['codec'] == 'h265',
+                         v['data_size'], source_rank[v['source']])
+        return max(candidates, key=key)
+    key = lambda v: (v['data_size'] or float('inf'), v['bitrate'] or float('inf'),
+                     v['resolution'], -source_rank[v['source']])
+    return min(candidates, key=key)
+
+class VideoRecord:
+    """提取出的单个视频，用__slots__代替元数据字典，大量视频时内存占用更小"""
+    __slots__ = ('aweme_id', 'title', 'url', 'mirrors', 'author', 'create_time', 'raw_title', 'url_type',
+                 'stream')
+
+    def __init__(self, aweme_id, title, url, author='未知作者', create_time=0, raw_title='', url_type='',
+                 stream=None, mirrors=None):
+        self.aweme_id = aweme_id
+        self.title = title  # 用于显示和文件名的标题
+        self.url = url
+        self.mirrors = mirrors or [url]  # 同一个流的所有CDN地址，第一个即url
+        self.author = author
+        self.create_time = create_time
+        self.raw_title = raw_title or title
+        self.url_type = url_type  # 链接来源: play_addr / download_addr / bit_rate
+        self.stream = stream  # 选中流的画质信息: gear_name, bitrate, width, height, codec, data_size
+
+    def stream_summary(self):
+        """选中流的简短描述，用于提示信息"""
+        if not self.stream:
+            return ''
+        parts = []
+        if self.stream.get('resolution'):
+            parts.append(f"{self.stream['resolution']}p")
+        parts.append(self.stream.get('codec', '').upper())
+        if self.stream.get('bitrate'):
+            parts.append(f"{self.stream['bitrate'] / 1000:.0f} kbps")
+        if self.stream.get('data_size'):
+            parts.append(f"{self.stream['data_size'] / 1024 / 1024:.1f} MB")
+        return ' / '.join(p for p in parts if p)
+
+    def to_metadata(self):
+        """转换为可以写入任务数据库的字典"""
+        return {
+            'aweme_id': self.aweme_id,
+            'author': self.author,
+            'create_time': self.create_time,
+            'raw_title': self.raw_title,
+            'url_type': self.url_type,
+            'stream': self.stream,
+            'mirrors': self.mirrors,
+        }
+
+    @classmethod
+    def from_metadata(cls, title, url, metadata):
+        return cls(metadata.get('aweme_id', ''), title, url,
+                   author=metadata.get('author', '未知作者'),
+                   create_time=metadata.get('create_time', 0),
+                   raw_title=metadata.get('raw_title', title),
+                   url_type=metadata.get('url_type', ''),
+                   stream=metadata.get('stream'),
+                   mirrors=metadata.get('mirrors'))
 
 class DouyinDataExtractor(QObject):
-    data_extracted = pyqtSignal(str, str, dict)  # 添加aweme_id用于验证
+    """解析列表接口返回的aweme_list
+
+    既可以用extract_videos一次处理一批数据包，也可以常驻后台线程，
+    由process_packet在每个数据包到达时立即解析，新视频直接进入下载队列。
+    """
+    data_extracted = pyqtSignal(object)  # VideoRecord
     progress_updated = pyqtSignal(int, int)
     extraction_complete = pyqtSignal()
+    packet_processed = pyqtSignal(int, int)  # 本数据包新增的视频数, 累计不重复的视频数
 
-    def __init__(self, json_data_list):
+    def __init__(self, json_data_list=None, seen=None):
         super().__init__()
-        self.json_data_list = json_data_list
+        self.json_data_list = json_data_list or []
+        self.seen = seen if seen is not None else SeenIndex()  # 已提取或已在下载中心的aweme_id
+        self.packets_processed = 0
+        self.stream_policy = DEFAULT_STREAM_POLICY  # STREAM_POLICIES中的键
+
+    @pyqtSlot(str)
+    def process_raw(self, text):
+        """在提取线程中解析页面转发来的原始响应文本"""
+        try:
+            data = json_loads(text)
+        except ValueError as e:
+            extractor_log.warning("JSON解析错误: %s", e)
+            return
+        if isinstance(data, dict):
+            self.process_packet(data)
+
+    @pyqtSlot(dict)
+    def process_packet(self, json_data):
+        """解析单个数据包，只发送之前没有见过的视频；每个数据包只处理一次"""
+        added = 0
+        for aweme in json_data.get('aweme_list') or []:
+            try:
+                aweme_id = aweme.get('aweme_id', '')
+                if aweme_id and aweme_id in self.seen:
+                    continue
+                result = self.parse_aweme(aweme)
+                if result and (not aweme_id or self.seen.add(aweme_id)):
+                    self.data_extracted.emit(result)
+                    added += 1
+            except Exception as e:
+                extractor_log.warning("解析单个视频错误: %s", e, extra={'aweme_id': aweme.get('aweme_id')})
+        self.packets_processed += 1
+        self.packet_processed.emit(added, len(self.seen))
+
+    def parse_aweme(self, aweme):
+        """从单个aweme中提取VideoRecord，找不到链接时返回None"""
+        # 提取视频ID和其他元数据
+        aweme_id = aweme.get('aweme_id', '')
+        author_name = (aweme.get('author') or {}).get('nickname', '未知作者')
+        create_time = aweme.get('create_time', 0)
+
+        # 提取标题
+        title = (aweme.get('desc', '无标题') or '').strip()
+        if not title:
+            title = f"未命名视频_{aweme_id}"
+
+        stream = select_stream(aweme.get('video') or {}, self.stream_policy)
+        if stream:
+            url_type = stream['source']
+            mirrors = list(dict.fromkeys(normalize_video_url(u) for u in stream['url_list']))
+            video_url = mirrors[0]
+            stream = {k: v for k, v in stream.items() if k not in ('url_list', 'source')}
+            extractor_log.debug("%s | %s: 选中%s流 %s %sp %s，共%d个镜像 %s", author_name, title, url_type,
+                                stream.get('gear_name') or '-', stream['resolution'], stream['codec'],
+                                len(mirrors), video_url, extra={'aweme_id': aweme_id})
+
+            # 构建显示标题
+            display_title = f"{author_name}_{title[:30]}"
+            if len(title) > 30:
+                display_title += "..."
+            display_title = "".join(c for c in display_title if c.isalnum() or c in (' ', '-', '_')).strip()
+
+            return VideoRecord(aweme_id, display_title, video_url, author_name, create_time, title, url_type,
+                               stream, mirrors)
+        extractor_log.debug("%s | %s: 无法找到视频的下载链接", author_name, title, extra={'aweme_id': aweme_id})
+        return None
 
     def extract_videos(self):
         try:
@@ -427,195 +2123,387 @@ class DouyinDataExtractor(QObject):
                 
                 for aweme in aweme_list:
                     try:
-                        # 提取视频ID和其他元数据
-                        aweme_id = aweme.get('aweme_id', '')
-                        author_name = aweme.get('author', {}).get('nickname', '未知作者')
-                        create_time = aweme.get('create_time', 0)
-                        
-                        # 提取标题
-                        title = aweme.get('desc', '无标题').strip()
-                        if not title:
-                            title = f"未命名视频_{aweme_id}"
-
-                        # 创建元数据字典
-                        metadata = {
-                            'aweme_id': aweme_id,
-                            'author': author_name,
-                            'create_time': create_time,
-                            'raw_title': title
-                        }
-
-                        print(f"\n正在处理视频:")
-                        print(f"ID: {aweme_id}")
-                        print(f"标题: {title}")
-                        print(f"作者: {author_name}")
-                        
-                        video_url = None
-                        if 'video' in aweme:
-                            video_info = aweme['video']
-                            
-                            # 尝试获取无水印视频链接
-                            if 'play_addr' in video_info:
-                                play_addr = video_info['play_addr']
-                                if 'url_list' in play_addr and play_addr['url_list']:
-                                    video_url = play_addr['url_list'][0]
-                                    print(f"找到play_addr链接: {video_url}")
-                                    metadata['url_type'] = 'play_addr'
-                            
-                            # 如果没有找到无水印链接，尝试其他链接
-                            if not video_url and 'download_addr' in video_info:
-                                download_addr = video_info['download_addr']
-                                if 'url_list' in download_addr and download_addr['url_list']:
-                                    video_url = download_addr['url_list'][0]
-                                    print(f"找到download_addr链接: {video_url}")
-                                    metadata['url_type'] = 'download_addr'
-                            
-                            # 尝试bit_rate中的链接
-                            if not video_url and 'bit_rate' in video_info:
-                                for bit_rate in video_info['bit_rate']:
-                                    if 'play_addr' in bit_rate and 'url_list' in bit_rate['play_addr']:
-                                        url_list = bit_rate['play_addr']['url_list']
-                                        if url_list:
-                                            video_url = url_list[0]
-                                            print(f"找到bit_rate链接: {video_url}")
-                                            metadata['url_type'] = 'bit_rate'
-                                            break
-
-                        if video_url:
-                            # 处理URL
-                            if not video_url.startswith('http'):
-                                video_url = 'https:' + video_url
-                            
-                            # 移除水印参数
-                            if '&watermark=' in video_url:
-                                video_url = video_url.split('&watermark=')[0]
-                            
-                            print(f"最终视频链接: {video_url}")
-                            metadata['final_url'] = video_url
-                            
-                            # 构建显示标题
-                            display_title = f"{author_name}_{title[:30]}"
-                            if len(title) > 30:
-                                display_title += "..."
-                            display_title = "".join(c for c in display_title if c.isalnum() or c in (' ', '-', '_')).strip()
-                            
-                            self.data_extracted.emit(display_title, video_url, metadata)
-                        else:
-                            print(f"警告: 无法找到视频的下载链接")
-                    
+                        result = self.parse_aweme(aweme)
+                        if result:
+                            self.data_extracted.emit(result)
                     except Exception as e:
-                        print(f"解析单个视频错误: {str(e)}")
+                        extractor_log.warning("解析单个视频错误: %s", e, extra={'aweme_id': aweme.get('aweme_id')})
                     
                     processed += 1
                     self.progress_updated.emit(processed, total)
             
+            # 提取完成后不再保留原始数据包
+            self.json_data_list = []
             self.extraction_complete.emit()
         
         except Exception as e:
-            print(f"提取数据错误: {str(e)}")
+            extractor_log.exception("提取数据错误: %s", e)
             self.extraction_complete.emit()
 
-class WebPage(QWebEnginePage):
-    json_received = pyqtSignal(dict)
-    
-    def __init__(self, profile, parent=None):
-        super().__init__(profile, parent)
-    
-    def javaScriptConsoleMessage(self, level, message, line, source_id):
+# 抖音网页端列表接口：collection为收藏夹，post为用户主页作品，like为用户喜欢
+DOUYIN_API_ENDPOINTS = {
+    'collection': "https://www.douyin.com/aweme/v1/web/aweme/listcollection/",
+    'post': "https://www.douyin.com/aweme/v1/web/aweme/post/",
+    'like': "https://www.douyin.com/aweme/v1/web/aweme/favorite/",
+    'detail': "https://www.douyin.com/aweme/v1/web/aweme/detail/",
+    'multi_detail': "https://www.douyin.com/aweme/v1/web/multi/aweme/detail/",
+}
+DOUYIN_COMMON_PARAMS = "device_platform=webapp&aid=6383&channel=channel_pc_web"
+
+def douyin_api_url(kind, sec_user_id='', cursor=0, count=18):
+    """构建列表接口的请求URL"""
+    base = f"{DOUYIN_API_ENDPOINTS[kind]}?{DOUYIN_COMMON_PARAMS}&"
+    if kind == 'post':
+        return base + (f"sec_user_id={sec_user_id}&max_cursor={cursor}&show_live_replay_strategy=1&"
+                       f"need_time_list=1&time_list_query=0&whale_cut_token=&cut_version=1&"
+                       f"count={count}&publish_video_strategy_type=2&from_user_page=1")
+    if kind == 'like':
+        return base + (f"sec_user_id={sec_user_id}&max_cursor={cursor}&min_cursor=0&"
+                       f"whale_cut_token=&cut_version=1&count={count}&"
+                       f"publish_video_strategy_type=2")
+    return base + f"cursor={cursor}&count={count}"
+
+def extract_user_id(input_text):
+    """从用户输入中提取用户ID"""
+    # 如果输入的是完整URL
+    if "douyin.com/user/" in input_text:
+        # 提取URL中最后的用户ID部分
+        user_id = input_text.split("/user/")[-1].split("?")[0].strip()
+        return user_id
+    # 如果输入的就是用户ID
+    return input_text.strip()
+
+class DouyinApiCrawler(QObject):
+    """不依赖页面滚动，按游标直接翻页请求列表接口，使用已登录浏览器的Cookie"""
+    json_received = pyqtSignal(dict)  # 每一页的原始JSON数据
+    page_fetched = pyqtSignal(int, int)  # 已获取页数, 已获取视频数
+    crawl_finished = pyqtSignal(bool, str)  # 是否成功, 说明
+
+    def __init__(self, kind, sec_user_id='', cookies=None, page_size=50, page_delay=0.3, max_pages=1000):
+        super().__init__()
+        self.kind = kind
+        self.sec_user_id = sec_user_id
+        self.cookies = dict(cookies or {})
+        self.page_size = page_size  # 服务器可能会限制单页数量，超出部分会被忽略
+        self.page_delay = page_delay  # 两页之间的间隔（秒），避免请求过快被限流
+        self.max_pages = max_pages
+        self.is_stopped = False
+
+    def stop(self):
+        self.is_stopped = True
+
+    def fetch_page(self, session, cursor):
+        url = douyin_api_url(self.kind, self.sec_user_id, cursor, self.page_size)
+        if self.kind == 'collection':
+            # 收藏夹接口使用POST，游标放在表单里
+            response = session.post(url, data={'cursor': cursor, 'count': self.page_size}, timeout=(10, 30))
+        else:
+            response = session.get(url, timeout=(10, 30))
+        response.raise_for_status()
+        if not response.content:
+            raise ValueError("接口返回空数据，可能需要签名参数，请改用页面滚动抓取")
+        return response.json()
+
+    @staticmethod
+    def next_cursor(kind, data):
+        return data.get('cursor', 0) if kind == 'collection' else data.get('max_cursor', 0)
+
+    def run(self):
+        session = requests.Session()
+        session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept': 'application/json, text/plain, */*',
+            'Referer': 'https://www.douyin.com/',
+        })
+        session.cookies.update(self.cookies)
+        cursor = 0
+        pages = items = 0
         try:
-            if message.startswith('DOUYIN_JSON:'):
-                json_str = message[len('DOUYIN_JSON:'):]
-                data = json.loads(json_str)
+            while not self.is_stopped and pages < self.max_pages:
+                data = self.fetch_page(session, cursor)
+                if data.get('status_code', 0) != 0:
+                    raise ValueError(f"接口返回错误: {data.get('status_msg') or data.get('status_code')}")
+                pages += 1
+                items += len(data.get('aweme_list') or [])
                 self.json_received.emit(data)
+                self.page_fetched.emit(pages, items)
+
+                next_cursor = self.next_cursor(self.kind, data)
+                if not data.get('has_more') or next_cursor == cursor:
+                    break
+                cursor = next_cursor
+                time.sleep(self.page_delay)
+            self.crawl_finished.emit(True, f"共获取 {pages} 页，{items} 个视频")
         except Exception as e:
-            print(f"JSON解析错误: {str(e)}")
+            crawler_log.exception("接口翻页抓取出错: %s", e)
+            self.crawl_finished.emit(False, f"已获取 {pages} 页后出错: {str(e)}")
+        finally:
+            session.close()
 
-class WebEngineView(QWebEngineView):
-    def __init__(self, target_url, parent=None):
-        super().__init__(parent)
-        self.target_url = target_url
-        self.captured_data = []  # 存储所有捕获的数据
-        
-        # 创建自定义页面
-        self.custom_page = WebPage(self.page().profile(), self)
-        self.setPage(self.custom_page)
-        
-        # 连接信号
-        self.custom_page.json_received.connect(self.handle_json_response)
-        
-        # 页面加载完成后注入JS
-        self.loadFinished.connect(self.inject_js)
-    def handle_json_response(self, data):
-        # 将新数据追加到现有数据列表中
-        self.captured_data.append(data)
-        print(f"捕获到新的收藏列表数据，当前已捕获 {len(self.captured_data)} 个数据包")
-    
-    # 添加重置方法
-    def reset_captured_data(self):
-        self.captured_data = []
-        print("已重置捕获的数据")
+class UrlRefresher(QObject):
+    """播放地址带签名会过期，只按aweme_id重新请求详情接口获取新地址，不用重新抓取整个列表
 
-    def inject_js(self, ok):
-        if ok:
-            js_code = """
-            // 覆盖XMLHttpRequest原型
-            (function() {
-                const originalOpen = XMLHttpRequest.prototype.open;
-                XMLHttpRequest.prototype.open = function(method, url) {
-                    this._method = method;
-                    this._url = url;
-                    return originalOpen.apply(this, arguments);
-                };
-                
-                // 覆盖send方法
-                const originalSend = XMLHttpRequest.prototype.send;
-                XMLHttpRequest.prototype.send = function(body) {
-                    this.addEventListener('load', () => {
-                        if ((this._url.includes('listcollection') || 
-                             this._url.includes('aweme/post') ||
-                             this._url.includes('aweme/favorite')) && 
-                            this.getResponseHeader('Content-Type') && 
-                            this.getResponseHeader('Content-Type').includes('application/json')) {
-                            try {
-                                const jsonData = JSON.parse(this.responseText);
-                                console.log('DOUYIN_JSON:' + JSON.stringify(jsonData));
-                            } catch(e) {
-                                console.error('JSON解析错误:', e);
-                            }
-                        }
-                    });
-                    return originalSend.apply(this, arguments);
-                };
-                
-                // 覆盖fetch API
-                const originalFetch = window.fetch;
-                window.fetch = function(input, init) {
-                    const requestUrl = typeof input === 'string' ? input : input.url;
-                    return originalFetch(input, init).then(response => {
-                        if ((requestUrl.includes('listcollection') || 
-                             requestUrl.includes('aweme/post') ||
-                             requestUrl.includes('aweme/favorite')) && 
-                            response.headers.get('Content-Type') && 
-                            response.headers.get('Content-Type').includes('application/json')) {
-                            response.clone().json().then(data => {
-                                console.log('DOUYIN_JSON:' + JSON.stringify(data));
-                            });
-                        }
-                        return response;
-                    });
-                };
-            })();
-            """
-            self.page().runJavaScript(js_code)
-    
-    def handle_json_response(self, data):
-        self.captured_data.append(data)
-        print(f"捕获到收藏列表数据，包含 {len(data.get('aweme_list', []))} 个视频")
+    短时间内过期的多个任务合并成一批，优先用批量详情接口一次取回。
+    """
+    refreshed = pyqtSignal(str, object)  # aweme_id, VideoRecord；刷新失败时为None
+
+    def __init__(self, parse, cookies=None, batch_size=20, batch_delay=1.0):
+        super().__init__()
+        self.parse = parse  # aweme字典 -> VideoRecord，与提取器使用同一个画质策略
+        # 浏览器Cookie字典的引用，请求时复制一份，登录状态变化后自动使用新的Cookie
+        self.cookies = cookies if cookies is not None else {}
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay  # 等待同一批中其他过期任务的时间（秒）
+        self.pending = []
+        self.timer = None  # 在工作线程中创建
+
+    @pyqtSlot(str)
+    def request(self, aweme_id):
+        if aweme_id not in self.pending:
+            self.pending.append(aweme_id)
+        if self.timer is None:
+            self.timer = QTimer(self)
+            self.timer.setSingleShot(True)
+            self.timer.timeout.connect(self.flush)
+        if not self.timer.isActive():
+            self.timer.start(int(self.batch_delay * 1000))
+
+    def flush(self):
+        session = requests.Session()
+        session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept': 'application/json, text/plain, */*',
+            'Referer': 'https://www.douyin.com/',
+        })
+        session.cookies.update(dict(self.cookies))
+        try:
+            while self.pending:
+                batch, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+                try:
+                    details = self.fetch_details(session, batch)
+                except Exception as e:
+                    crawler_log.warning("刷新视频链接出错: %s", e)
+                    details = {}
+                crawler_log.info("刷新 %d 个过期链接，成功 %d 个", len(batch), len(details))
+                for aweme_id in batch:
+                    video = None
+                    if aweme_id in details:
+                        try:
+                            video = self.parse(details[aweme_id])
+                        except Exception as e:
+                            crawler_log.warning("解析视频详情错误: %s", e)
+                    self.refreshed.emit(aweme_id, video)
+        finally:
+            session.close()
 
-class DownloadButton(QPushButton):
-    def __init__(self, text, task_id):
-        super().__init__(text)
+    def fetch_details(self, session, aweme_ids):
+        """返回 {aweme_id: aweme字典}，批量接口不可用时逐个请求单视频详情接口"""
+        details = {}
+        if len(aweme_ids) > 1:
+            try:
+                url = f"{DOUYIN_API_ENDPOINTS['multi_detail']}?{DOUYIN_COMMON_PARAMS}"
+                response = session.post(url, data={'aweme_ids': json.dumps(aweme_ids)}, timeout=(10, 30))
+                response.raise_for_status()
+                for aweme in response.json().get('aweme_details') or []:
+                    if aweme and aweme.get('aweme_id'):
+                        details[str(aweme['aweme_id'])] = aweme
+            except (requests.RequestException, ValueError) as e:
+                crawler_log.info("批量详情接口不可用，改为逐个请求: %s", e)
+        for aweme_id in aweme_ids:
+            if aweme_id in details:
+                continue
+            url = f"{DOUYIN_API_ENDPOINTS['detail']}?{DOUYIN_COMMON_PARAMS}&aweme_id={aweme_id}"
+            response = session.get(url, timeout=(10, 30))
+            response.raise_for_status()
+            if not response.content:
+                continue
+            aweme = response.json().get('aweme_detail')
+            if aweme:
+                details[aweme_id] = aweme
+        return details
+
+class DownloadRecord:
+    """下载中心一行显示的数据"""
+    __slots__ = ('task_id', 'title', 'tooltip', 'status', 'current', 'total', 'size_text')
+
+    def __init__(self, task_id, title, tooltip='', status="等待中"):
         self.task_id = task_id
+        self.title = title
+        self.tooltip = tooltip
+        self.status = status
+        self.current = 0
+        self.total = 0
+        self.size_text = "0 MB"
+
+class DownloadTableModel(QAbstractTableModel):
+    """下载中心的表格模型，插入的行先缓存，在下一次事件循环中批量插入"""
+    COLUMNS = ["视频标题", "进度", "状态", "操作", "大小"]
+    TITLE, PROGRESS, STATUS, ACTIONS, SIZE = range(5)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []  # 已显示的记录，按行顺序排列
+        self.records = {}  # task_id -> DownloadRecord，包括尚未插入的记录
+        self.row_of = {}  # task_id -> 行号
+        self.pending = []  # 等待批量插入的记录
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self.rows[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == self.TITLE:
+                return record.title
+            if column == self.STATUS:
+                return record.status
+            if column == self.SIZE:
+                return record.size_text
+        elif role == Qt.ToolTipRole and column == self.TITLE:
+            return record.tooltip
+        elif role == Qt.UserRole:
+            return record
+        return None
+
+    def add_record(self, record):
+        if record.task_id in self.records:
+            return False
+        self.records[record.task_id] = record
+        self.pending.append(record)
+        if len(self.pending) == 1:
+            QTimer.singleShot(0, self.flush_pending)
+        return True
+
+    def flush_pending(self):
+        if not self.pending:
+            return
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(self.pending) - 1)
+        for offset, record in enumerate(self.pending):
+            self.row_of[record.task_id] = first + offset
+            self.rows.append(record)
+        self.pending = []
+        self.endInsertRows()
+
+    def record(self, task_id):
+        return self.records.get(task_id)
+
+    def remove_task(self, task_id):
+        record = self.records.pop(task_id, None)
+        if record is None:
+            return
+        row = self.row_of.pop(task_id, None)
+        if row is None:
+            self.pending.remove(record)
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        # 删除一行是O(n)：后面各行的行号逐个前移。QPersistentModelIndex同样是O(n)，
+        # 而且Qt更新持久索引的开销更大（4000行时慢十几倍），单次取消的代价在毫秒级
+        for r in range(row, len(self.rows)):
+            self.row_of[self.rows[r].task_id] = r
+        self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.rows = []
+        self.records = {}
+        self.row_of = {}
+        self.pending = []
+        self.endResetModel()
+
+    def set_status(self, task_id, status):
+        record = self.records.get(task_id)
+        if record is not None:
+            record.status = status
+            self._changed(task_id, self.STATUS, self.STATUS)
+
+    def set_progress(self, task_id, current, total, size_text):
+        record = self.records.get(task_id)
+        if record is not None:
+            record.current = current
+            record.total = total
+            record.size_text = size_text
+            self._changed(task_id, self.PROGRESS, self.SIZE)
+
+    def _changed(self, task_id, first_column, last_column):
+        row = self.row_of.get(task_id)
+        if row is not None:
+            self.dataChanged.emit(self.index(row, first_column), self.index(row, last_column))
+
+class ProgressDelegate(QStyledItemDelegate):
+    """直接绘制进度条，不为每一行创建QProgressBar"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.style_widget = QProgressBar()  # 仅用于套用样式表，不会显示
+
+    def paint(self, painter, option, index):
+        record = index.data(Qt.UserRole)
+        if record is None:
+            return
+        bar = QStyleOptionProgressBar()
+        height = min(24, option.rect.height())
+        bar.rect = QRect(option.rect.x() + 4, option.rect.center().y() - height // 2,
+                         option.rect.width() - 8, height)
+        bar.minimum = 0
+        bar.maximum = 1000
+        bar.progress = int(record.current * 1000 / record.total) if record.total else 0
+        bar.text = f"{bar.progress // 10}%"
+        bar.textVisible = True
+        bar.textAlignment = Qt.AlignCenter
+        bar.state = QStyle.State_Enabled | QStyle.State_Horizontal
+        self.style_widget.style().drawControl(QStyle.CE_ProgressBar, bar, painter, self.style_widget)
+
+class ActionButtonsDelegate(QStyledItemDelegate):
+    """绘制开始/暂停/取消按钮，并根据点击位置发出对应的操作"""
+    action_triggered = pyqtSignal(str, str)  # task_id, action
+    ACTIONS = [
+        ("start", "开始", QStyle.SP_MediaPlay),
+        ("pause", "暂停", QStyle.SP_MediaPause),
+        ("cancel", "取消", QStyle.SP_DialogCancelButton),
+    ]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.style_widget = QPushButton()  # 仅用于套用样式表，不会显示
+
+    def button_rects(self, rect, spacing=8, height=36):
+        width = (rect.width() - spacing * (len(self.ACTIONS) + 1)) // len(self.ACTIONS)
+        y = rect.center().y() - height // 2
+        return [QRect(rect.x() + spacing + i * (width + spacing), y, width, height)
+                for i in range(len(self.ACTIONS))]
+
+    def paint(self, painter, option, index):
+        style = self.style_widget.style()
+        for (action, text, icon), rect in zip(self.ACTIONS, self.button_rects(option.rect)):
+            button = QStyleOptionButton()
+            button.rect = rect
+            button.text = text
+            button.icon = style.standardIcon(icon)
+            button.iconSize = QSize(16, 16)
+            button.state = QStyle.State_Enabled | QStyle.State_Raised
+            style.drawControl(QStyle.CE_PushButton, button, painter, self.style_widget)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            record = index.data(Qt.UserRole)
+            for (action, _, _), rect in zip(self.ACTIONS, self.button_rects(option.rect)):
+                if record is not None and rect.contains(event.pos()):
+                    self.action_triggered.emit(record.task_id, action)
+                    return True
+        return super().editorEvent(event, model, option, index)
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -632,11 +2520,22 @@ class MainWindow(QMainWindow):
         
         # 初始化下载管理器（移到最前面）
         default_save_path = os.path.join(os.path.expanduser("~"), "Downloads", "douyin_videos")
-        self.download_manager = DownloadManager(default_save_path)
+        self.task_store, self.seen_index = open_task_store()
+        self.download_manager = DownloadManager(default_save_path, store=self.task_store, seen=self.seen_index)
+        self.download_manager.progress_aggregator.progress_batch.connect(self.update_download_progress_batch)
         
         # 存储提取的视频数据
-        self.video_data = []  # [(title, url, metadata), ...]
-        self.extraction_thread = None
+        self.video_data = []  # [VideoRecord, ...]
+        self.crawler_thread = None
+        self.browser_cookies = {}  # 内置浏览器的登录Cookie，浏览器创建之前链接刷新器就持有它
+
+        # 常驻后台线程的提取器，数据包到达后立即解析并加入下载队列
+        self.extraction_thread = QThread()
+        self.extractor = DouyinDataExtractor(seen=self.seen_index)
+        self.extractor.moveToThread(self.extraction_thread)
+        self.extractor.data_extracted.connect(self.handle_video_data)
+        self.extractor.packet_processed.connect(self.on_packet_processed)
+        self.extraction_thread.start()
         
         # 创建主布局
         main_layout = QVBoxLayout()
@@ -661,6 +2560,46 @@ class MainWindow(QMainWindow):
         container.setLayout(main_layout)
         self.setCentralWidget(container)
 
+        # 播放地址过期的任务按aweme_id单独刷新，使用浏览器的Cookie
+        self.refresh_thread = QThread()
+        self.url_refresher = UrlRefresher(self.extractor.parse_aweme, self.browser_cookies)
+        self.url_refresher.moveToThread(self.refresh_thread)
+        self.download_manager.url_refresh_needed.connect(self.url_refresher.request)
+        self.url_refresher.refreshed.connect(self.download_manager.apply_refreshed_url)
+        self.refresh_thread.start()
+
+        # 重建已下载索引，然后恢复上次未完成的下载任务
+        self.download_manager.rescan_directory()
+        self.restore_tasks()
+
+    def restore_tasks(self):
+        """从任务数据库恢复下载中心，之前正在下载或排队的任务会自动从断点继续"""
+        to_resume = []
+        for row in self.task_store.load_tasks():
+            video = VideoRecord.from_metadata(row['title'], row['url'], row['metadata'])
+            video.aweme_id = row['aweme_id']
+            self.add_download_task(video, row['save_path'])
+            task = self.download_manager.tasks.get(row['aweme_id'])
+            if task is None or task.is_completed:
+                continue
+            task.current_size = row['bytes_done']
+            task.total_size = row['total_bytes']
+            task.etag = row['etag']
+            status = row['status']
+            if status not in TASK_STATES and not status.startswith(("错误", "下载失败")):
+                status = "下载中"  # 旧版本会把下载过程中的提示文字写入数据库
+            if status in ["下载中", "排队中"]:
+                to_resume.append(row['aweme_id'])
+            elif status == "已完成":
+                status = "等待中"  # 文件已被删除，需要重新下载
+            elif status != "等待中":
+                status = "已暂停" if row['bytes_done'] else "下载失败"
+            self.download_model.set_status(row['aweme_id'], status)
+            if row['total_bytes']:
+                self.update_download_progress(row['aweme_id'], row['bytes_done'], row['total_bytes'])
+        for task_id in to_resume:
+            self.download_manager.start_task(task_id)
+
     def setup_crawler_ui(self):
         layout = QVBoxLayout()
         layout.setSpacing(15)
@@ -702,14 +2641,24 @@ class MainWindow(QMainWindow):
         self.load_button.setEnabled(False)
         url_layout.addWidget(self.load_button)
 
+        self.api_crawl_button = QPushButton("接口翻页抓取")
+        self.api_crawl_button.setIcon(self.style().standardIcon(QStyle.SP_MediaSeekForward))
+        self.api_crawl_button.setToolTip("登录后使用浏览器的Cookie直接按游标请求列表接口，无需手动滚动页面")
+        self.api_crawl_button.clicked.connect(self.crawl_via_api)
+        self.api_crawl_button.setEnabled(False)
+        url_layout.addWidget(self.api_crawl_button)
+
         layout.addLayout(url_layout)
 
-        # 浏览器区域
-        self.browser = WebEngineView(
-            target_url="https://www.douyin.com/aweme/v1/web/aweme/listcollection/"
-        )
-        self.browser.setMinimumHeight(400)
-        layout.addWidget(self.browser, 1)
+        # 浏览器区域：Chromium启动较慢，选择功能后才创建内置浏览器
+        self.browser = None
+        self.browser_area = QVBoxLayout()
+        self.browser_placeholder = QLabel("选择功能后将启动内置浏览器")
+        self.browser_placeholder.setAlignment(Qt.AlignCenter)
+        self.browser_placeholder.setStyleSheet("color: #888888;")
+        self.browser_placeholder.setMinimumHeight(400)
+        self.browser_area.addWidget(self.browser_placeholder)
+        layout.addLayout(self.browser_area, 1)
 
         # 控制按钮
         button_layout = QHBoxLayout()
@@ -731,28 +2680,45 @@ class MainWindow(QMainWindow):
 
         layout.addLayout(button_layout)
 
-        # 状态标签和进度条
+        # 状态标签
         status_layout = QHBoxLayout()
         self.status_label = QLabel("请选择要使用的功能")
         self.status_label.setStyleSheet("padding: 5px;")
         status_layout.addWidget(self.status_label, 1)
 
-        self.progress_bar = QProgressBar()
-        self.progress_bar.setVisible(False)
-        status_layout.addWidget(self.progress_bar)
-
         layout.addLayout(status_layout)
 
         self.crawler_widget.setLayout(layout)
 
+    def ensure_browser(self):
+        """第一次使用抓取功能时才导入WebEngine并创建浏览器"""
+        if self.browser is not None:
+            return self.browser
+        started = time.perf_counter()
+        import browser as browser_module
+        browser_module.configure_profile()
+        self.browser = browser_module.WebEngineView(
+            target_url="https://www.douyin.com/aweme/v1/web/aweme/listcollection/",
+            cookies=self.browser_cookies
+        )
+        self.browser.setMinimumHeight(400)
+        self.browser.custom_page.raw_json_received.connect(self.extractor.process_raw)
+        # 自动启用提取按钮当捕获到数据时
+        self.browser.custom_page.raw_json_received.connect(lambda: self.extract_button.setEnabled(True))
+
         # 添加加载状态监控
         self.browser.loadStarted.connect(self.on_load_started)
         self.browser.loadProgress.connect(self.on_load_progress)
         self.browser.loadFinished.connect(self.on_load_finished)
 
         # 设置用户代理
-        user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
-        self.browser.page().profile().setHttpUserAgent(user_agent)
+        self.browser.page().profile().setHttpUserAgent(USER_AGENT)
+
+        self.browser_area.replaceWidget(self.browser_placeholder, self.browser)
+        self.browser_placeholder.deleteLater()
+        self.browser_placeholder = None
+        ui_log.info("内置浏览器启动耗时 %.0f ms", (time.perf_counter() - started) * 1000)
+        return self.browser
 
     def setup_download_ui(self):
         layout = QVBoxLayout()
@@ -789,6 +2755,56 @@ class MainWindow(QMainWindow):
 
         # Global Actions
         global_actions_layout = QHBoxLayout()
+        global_actions_layout.addWidget(QLabel("同时下载:"))
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, 32)
+        self.concurrency_spin.setValue(self.download_manager.max_concurrent)
+        self.concurrency_spin.valueChanged.connect(self.download_manager.set_max_concurrent)
+        global_actions_layout.addWidget(self.concurrency_spin)
+        global_actions_layout.addWidget(QLabel("单主机:"))
+        self.per_host_spin = QSpinBox()
+        self.per_host_spin.setRange(0, 32)
+        self.per_host_spin.setValue(self.download_manager.per_host_limit)
+        self.per_host_spin.setSpecialValueText("不限")
+        self.per_host_spin.setToolTip("同一个CDN主机同时下载的任务上限，大多数视频来自同一主机时需要一起调大")
+        self.per_host_spin.valueChanged.connect(self.download_manager.set_per_host_limit)
+        global_actions_layout.addWidget(self.per_host_spin)
+        global_actions_layout.addWidget(QLabel("分段:"))
+        self.segments_spin = QSpinBox()
+        self.segments_spin.setRange(1, 16)
+        self.segments_spin.setValue(self.download_manager.segments)
+        self.segments_spin.setToolTip("大于1时，支持断点续传的大文件会拆分成多个连接并行下载")
+        self.segments_spin.valueChanged.connect(self.download_manager.set_segments)
+        global_actions_layout.addWidget(self.segments_spin)
+        global_actions_layout.addWidget(QLabel("引擎:"))
+        self.backend_combo = QComboBox()
+        self.backend_combo.addItem("多线程", "thread")
+        if AIOHTTP_AVAILABLE:
+            self.backend_combo.addItem("协程", "asyncio")
+        self.backend_combo.setToolTip("协程引擎在单个事件循环中运行所有下载，适合大量任务；切换后对新添加的任务生效")
+        self.backend_combo.currentIndexChanged.connect(
+            lambda index: self.download_manager.set_backend(self.backend_combo.itemData(index))
+        )
+        global_actions_layout.addWidget(self.backend_combo)
+        global_actions_layout.addWidget(QLabel("画质:"))
+        self.stream_policy_combo = QComboBox()
+        for key, (label, *_rest) in STREAM_POLICIES.items():
+            self.stream_policy_combo.addItem(label, key)
+        self.stream_policy_combo.setToolTip("在视频的所有码率版本中按此策略选择下载的流；切换后对新提取的视频生效")
+        self.stream_policy_combo.currentIndexChanged.connect(
+            lambda index: setattr(self.extractor, 'stream_policy', self.stream_policy_combo.itemData(index))
+        )
+        global_actions_layout.addWidget(self.stream_policy_combo)
+        global_actions_layout.addWidget(QLabel("限速:"))
+        self.bandwidth_spin = QSpinBox()
+        self.bandwidth_spin.setRange(0, 1024 * 1024)
+        self.bandwidth_spin.setSingleStep(256)
+        self.bandwidth_spin.setSuffix(" KB/s")
+        self.bandwidth_spin.setSpecialValueText("不限速")
+        self.bandwidth_spin.setToolTip("所有任务合计的下载速度上限，右键单个任务可以单独限速")
+        self.bandwidth_spin.valueChanged.connect(self.download_manager.set_bandwidth_limit)
+        global_actions_layout.addWidget(self.bandwidth_spin)
+
         self.start_all_button = QPushButton("全部开始")
         self.start_all_button.setObjectName("GlobalControlButton")
         self.start_all_button.setIcon(self.style().standardIcon(QStyle.SP_MediaPlay))
@@ -817,23 +2833,34 @@ class MainWindow(QMainWindow):
         layout.addWidget(line)
 
         # Download Table
-        self.download_table = QTableWidget()
-        self.download_table.setColumnCount(6)
-        self.download_table.setHorizontalHeaderLabels(["视频标题", "进度", "状态", "操作", "大小", "任务ID"])
+        self.download_model = DownloadTableModel(self)
+        self.download_table = QTableView()
+        self.download_table.setModel(self.download_model)
+        self.progress_delegate = ProgressDelegate(self.download_table)
+        self.download_table.setItemDelegateForColumn(DownloadTableModel.PROGRESS, self.progress_delegate)
+        self.action_delegate = ActionButtonsDelegate(self.download_table)
+        self.action_delegate.action_triggered.connect(self.handle_task_action)
+        self.download_table.setItemDelegateForColumn(DownloadTableModel.ACTIONS, self.action_delegate)
         self.download_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
         self.download_table.setAlternatingRowColors(True)
         self.download_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.download_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.download_table.verticalHeader().setVisible(False)
+        self.download_table.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.download_table.customContextMenuRequested.connect(self.show_task_context_menu)
         self.download_table.setColumnWidth(1, 150)
         self.download_table.setColumnWidth(2, 100)
         self.download_table.setColumnWidth(3, 380)  # 增加操作列的宽度
-        self.download_table.setColumnWidth(4, 120)
-        self.download_table.hideColumn(5)
+        self.download_table.setColumnWidth(4, 260)
         
         # 设置行高
-        self.download_table.verticalHeader().setDefaultSectionSize(70)  # 设置默认行高为50像素
+        self.download_table.verticalHeader().setDefaultSectionSize(70)  # 设置默认行高为70像素
         
         layout.addWidget(self.download_table)
+
+        self.connection_stats_label = QLabel("")
+        self.connection_stats_label.setStyleSheet("color: #888888;")
+        layout.addWidget(self.connection_stats_label)
         
         self.download_widget.setLayout(layout)
     
@@ -862,18 +2889,14 @@ class MainWindow(QMainWindow):
             subprocess.Popen(["xdg-open", path])
 
     def start_all_tasks(self):
-        for row in range(self.download_table.rowCount()):
-            status_item = self.download_table.item(row, 2)
-            if status_item and status_item.text() in ["等待中", "已暂停", "下载失败"]:
-                task_id = self.download_table.item(row, 5).text()
-                self.download_manager.start_task(task_id)
+        for record in self.download_model.records.values():
+            if record.status in ["等待中", "已暂停", "下载失败"]:
+                self.download_manager.start_task(record.task_id)
 
     def pause_all_tasks(self):
-        for row in range(self.download_table.rowCount()):
-            status_item = self.download_table.item(row, 2)
-            if status_item and status_item.text() == "下载中":
-                task_id = self.download_table.item(row, 5).text()
-                self.download_manager.pause_task(task_id)
+        # 按下载管理器的状态判断，等待重试、刷新链接或切换镜像的任务显示的文字各不相同
+        for task_id in self.download_manager.pause_all():
+            self.download_model.set_status(task_id, "已暂停")
 
     def clear_all_tasks(self):
         reply = QMessageBox.question(self, '确认操作', 
@@ -882,92 +2905,45 @@ class MainWindow(QMainWindow):
 
         if reply == QMessageBox.Yes:
             # First, tell all running tasks to cancel
-            for row in range(self.download_table.rowCount()):
-                task_id = self.download_table.item(row, 5).text()
+            for task_id in list(self.download_model.records):
                 self.download_manager.cancel_task(task_id)
             
             # Then, clear the table view
-            self.download_table.setRowCount(0)
+            self.download_model.clear()
+            self.download_manager.clear_store()
+            self.seen_index.clear()
 
-    def add_download_task(self, title, url, metadata):
-        print(f"\n尝试创建下载任务:")
-        print(f"标题: {title}")
-        print(f"作者: {metadata['author']}")
-        print(f"视频ID: {metadata['aweme_id']}")
-        print(f"URL: {url}")
+    def add_download_task(self, video, save_path=None):
+        ui_log.debug("创建下载任务: %s - %s %s", video.title, video.author, video.url,
+                     extra={'aweme_id': video.aweme_id})
 
         # 使用 aweme_id 作为任务ID
-        aweme_id = metadata.get('aweme_id')
-        if not aweme_id:
-            print("错误：视频没有aweme_id，无法创建下载任务。")
+        if not video.aweme_id:
+            ui_log.warning("视频没有aweme_id，无法创建下载任务: %s", video.title)
             return
         
         # 创建新的下载任务
-        task_id = self.download_manager.add_task(url, title, aweme_id)
+        task_id = self.download_manager.add_task(video.url, video.title, video.aweme_id,
+                                                 video.to_metadata(), save_path, video.mirrors)
         
         # 检查UI中是否已存在此任务
-        if self.find_row_by_task_id(task_id) is not None:
-            print(f"UI中已存在任务 {task_id}，跳过添加新行。")
+        if self.download_model.record(task_id) is not None:
+            ui_log.debug("界面中已存在任务，跳过添加新行", extra={'task_id': task_id})
             return
         
-        # 在表格中添加新行
-        row = self.download_table.rowCount()
-        self.download_table.insertRow(row)
-        
-        # 设置标题（包含作者信息）
-        title_display = f"{title} - {metadata['author']}"
-        title_item = QTableWidgetItem(title_display)
-        title_item.setToolTip(f"视频ID: {metadata['aweme_id']}\n原始标题: {metadata['raw_title']}")
-        self.download_table.setItem(row, 0, title_item)
-        
-        # 设置进度条
-        progress_bar = QProgressBar()
-        progress_bar.setTextVisible(True)
-        self.download_table.setCellWidget(row, 1, progress_bar)
-        
-        # 设置状态
-        status_item = QTableWidgetItem("等待中")
-        self.download_table.setItem(row, 2, status_item)
-        
-        # 创建按钮控件
-        button_widget = QWidget()
-        button_layout = QHBoxLayout(button_widget)
-        button_layout.setContentsMargins(0, 0, 0, 0)
+        # 在表格中添加新行（设置标题，包含作者信息）
+        title_display = f"{video.title} - {video.author}"
+        tooltip = f"视频ID: {video.aweme_id}\n原始标题: {video.raw_title}"
+        if video.stream:
+            tooltip += f"\n画质: {video.stream_summary()}"
+        self.download_model.add_record(DownloadRecord(task_id, title_display, tooltip))
         
-        # 创建带有任务ID的按钮
-        start_button = DownloadButton("开始", task_id)
-        start_button.setIcon(self.style().standardIcon(QStyle.SP_MediaPlay))
-        pause_button = DownloadButton("暂停", task_id)
-        pause_button.setIcon(self.style().standardIcon(QStyle.SP_MediaPause))
-        cancel_button = DownloadButton("取消", task_id)
-        cancel_button.setIcon(self.style().standardIcon(QStyle.SP_DialogCancelButton))
-        
-        # 连接按钮信号
-        start_button.clicked.connect(self.start_download_by_button)
-        pause_button.clicked.connect(self.pause_download_by_button)
-        cancel_button.clicked.connect(self.cancel_download_by_button)
-        
-        button_layout.addWidget(start_button)
-        button_layout.addWidget(pause_button)
-        button_layout.addWidget(cancel_button)
-        
-        self.download_table.setCellWidget(row, 3, button_widget)
-        
-        # 设置大小
-        size_item = QTableWidgetItem("0 MB")
-        self.download_table.setItem(row, 4, size_item)
-        
-        # 设置任务ID（隐藏列）
-        task_id_item = QTableWidgetItem(task_id)
-        self.download_table.setItem(row, 5, task_id_item)
-        
-        print(f"任务ID: {task_id}")
-        
-        # 连接下载管理器的信号
+        # 进度由 download_manager.progress_aggregator 汇总后批量更新
         task = self.download_manager.tasks[task_id]
-        task.progress_updated.connect(
-            lambda tid, current, total: self.update_download_progress(tid, current, total)
-        )
+        if task.is_completed:
+            ui_log.debug("视频已下载过，跳过下载: %s", task.file_path, extra={'task_id': task_id})
+            self.download_model.set_status(task_id, "已完成")
+            self.update_download_progress(task_id, task.total_size, task.total_size)
         task.status_updated.connect(
             lambda tid, status: self.update_download_status(tid, status)
         )
@@ -975,78 +2951,77 @@ class MainWindow(QMainWindow):
             lambda tid, success: self.handle_download_finished(tid, success)
         )
 
-    def find_row_by_task_id(self, task_id):
-        """根据任务ID查找行号"""
-        for row in range(self.download_table.rowCount()):
-            if self.download_table.item(row, 5) and self.download_table.item(row, 5).text() == task_id:
-                return row
-        return None
-
-    def start_download_by_button(self):
-        button = self.sender()
-        if isinstance(button, DownloadButton):
-            task_id = button.task_id
-            print(f"开始下载任务 - 任务ID: {task_id}")
-            self.download_manager.start_task(task_id)
-            row = self.find_row_by_task_id(task_id)
-            if row is not None:
-                self.download_table.item(row, 2).setText("下载中")
-
-    def pause_download_by_button(self):
-        button = self.sender()
-        if isinstance(button, DownloadButton):
-            task_id = button.task_id
-            print(f"暂停下载任务 - 任务ID: {task_id}")
-            self.download_manager.pause_task(task_id)
-            row = self.find_row_by_task_id(task_id)
-            if row is not None:
-                self.download_table.item(row, 2).setText("已暂停")
-
-    def cancel_download_by_button(self):
-        button = self.sender()
-        if isinstance(button, DownloadButton):
-            task_id = button.task_id
-            print(f"取消下载任务 - 任务ID: {task_id}")
-            self.download_manager.cancel_task(task_id)
-            row = self.find_row_by_task_id(task_id)
-            if row is not None:
-                self.download_table.removeRow(row)
-
-    def update_download_progress(self, task_id, current, total):
-        row = self.find_row_by_task_id(task_id)
-        if row is not None:
-            progress_bar = self.download_table.cellWidget(row, 1)
-            if progress_bar:
-                progress_bar.setMaximum(total)
-                progress_bar.setValue(current)
-            
-            # 更新大小显示
-            size_mb = current / 1024 / 1024
-            total_mb = total / 1024 / 1024
-            size_text = f"{size_mb:.1f}/{total_mb:.1f} MB"
-            self.download_table.item(row, 4).setText(size_text)
+    def handle_task_action(self, task_id, action):
+        if action == "start":
+            self.start_download(task_id)
+        elif action == "pause":
+            self.pause_download(task_id)
+        elif action == "cancel":
+            self.cancel_download(task_id)
+
+    def start_download(self, task_id):
+        ui_log.debug("开始下载任务", extra={'task_id': task_id})
+        # 状态由下载管理器更新为"排队中"或"下载中"
+        self.download_manager.start_task(task_id)
+
+    def pause_download(self, task_id):
+        ui_log.debug("暂停下载任务", extra={'task_id': task_id})
+        self.download_manager.pause_task(task_id)
+        self.download_model.set_status(task_id, "已暂停")
+
+    def cancel_download(self, task_id):
+        ui_log.debug("取消下载任务", extra={'task_id': task_id})
+        self.download_manager.cancel_task(task_id)
+        self.download_model.remove_task(task_id)
+
+    def update_download_progress_batch(self, batch):
+        for task_id, current, total, rate, eta in batch:
+            self.update_download_progress(task_id, current, total, rate, eta)
+
+    def update_download_progress(self, task_id, current, total, rate=0.0, eta=None):
+        # 更新大小显示
+        size_mb = current / 1024 / 1024
+        total_mb = total / 1024 / 1024
+        size_text = f"{size_mb:.1f}/{total_mb:.1f} MB"
+        if rate > 0 and current < total:
+            size_text += f"  {rate / 1024 / 1024:.1f} MB/s"
+            if eta is not None:
+                size_text += f" 剩余 {int(eta) // 60}:{int(eta) % 60:02d}"
+        self.download_model.set_progress(task_id, current, total, size_text)
+
+    def show_task_context_menu(self, pos):
+        index = self.download_table.indexAt(pos)
+        if not index.isValid():
+            return
+        task_id = self.download_model.rows[index.row()].task_id
+        task = self.download_manager.tasks.get(task_id)
+        if task is None:
+            return
+        menu = QMenu(self)
+        limit_action = menu.addAction("单独限速...")
+        if menu.exec_(self.download_table.viewport().mapToGlobal(pos)) != limit_action:
+            return
+        kbps, ok = QInputDialog.getInt(self, "单独限速", "该任务的下载速度上限 (KB/s，0为不限速):",
+                                       task.bandwidth.rate // 1024, 0, 1024 * 1024, 256)
+        if ok:
+            self.download_manager.set_task_bandwidth_limit(task_id, kbps)
 
     def update_download_status(self, task_id, status):
-        row = self.find_row_by_task_id(task_id)
-        if row is not None:
-            self.download_table.item(row, 2).setText(status)
+        self.download_model.set_status(task_id, status)
 
     def handle_download_finished(self, task_id, success):
-        row = self.find_row_by_task_id(task_id)
-        if row is not None:
-            if success:
-                self.download_table.item(row, 2).setText("已完成")
-            else:
-                self.download_table.item(row, 2).setText("下载失败")
-
-    def handle_video_data(self, title, video_url, metadata):
-        # 检查是否已存在相同的视频ID
-        if not any(meta.get('aweme_id') == metadata['aweme_id'] for _, _, meta in self.video_data):
-            self.video_data.append((title, video_url, metadata))
-            # 自动添加到下载中心
-            self.add_download_task(title, video_url, metadata)
-        else:
-            print(f"跳过重复视频: {title} (ID: {metadata['aweme_id']})")
+        if not success and self.download_manager.is_retry_pending(task_id):
+            return  # 下载管理器已安排自动重试，保留其显示的等待状态
+        self.download_model.set_status(task_id, "已完成" if success else "下载失败")
+        stats = http_pool.stats()
+        self.connection_stats_label.setText(
+            f"HTTP请求 {stats['requests']} 次，新建连接 {stats['connections']} 个，复用连接 {stats['reused']} 次")
+
+    def handle_video_data(self, video):
+        # 提取器已通过共享的 seen_index 去重，这里收到的都是新视频
+        self.video_data.append(video)
+        # 自动添加到下载中心
+        self.add_download_task(video)
 
     def on_load_started(self):
         self.status_label.setText("开始加载页面...")
@@ -1077,11 +3052,7 @@ class MainWindow(QMainWindow):
                 return
                 
             # 构建API请求URL
-            api_url = (f"https://www.douyin.com/aweme/v1/web/aweme/post/?"
-                      f"device_platform=webapp&aid=6383&channel=channel_pc_web&"
-                      f"sec_user_id={user_id}&max_cursor=0&show_live_replay_strategy=1&"
-                      f"need_time_list=1&time_list_query=0&whale_cut_token=&cut_version=1&"
-                      f"count=18&publish_video_strategy_type=2&from_user_page=1")
+            api_url = douyin_api_url('post', user_id)
             
             # 设置浏览器的目标URL
             self.browser.target_url = api_url
@@ -1099,11 +3070,7 @@ class MainWindow(QMainWindow):
                 return
                 
             # 构建API请求URL
-            api_url = (f"https://www.douyin.com/aweme/v1/web/aweme/favorite/?"
-                      f"device_platform=webapp&aid=6383&channel=channel_pc_web&"
-                      f"sec_user_id={user_id}&max_cursor=0&min_cursor=0&"
-                      f"whale_cut_token=&cut_version=1&count=18&"
-                      f"publish_video_strategy_type=2")
+            api_url = douyin_api_url('like', user_id)
             
             # 设置浏览器的目标URL
             self.browser.target_url = api_url
@@ -1124,19 +3091,54 @@ class MainWindow(QMainWindow):
         self.save_button.setEnabled(False)
         self.video_data = []  # 清空之前提取的视频数据
 
+    def crawl_via_api(self):
+        """按游标直接翻页请求列表接口，获取到的数据与页面捕获的数据走同样的提取流程"""
+        if self.crawler_thread and self.crawler_thread.isRunning():
+            self.crawler.stop()
+            return
+
+        if self.current_function == "favorite":
+            kind, user_id = 'collection', ''
+        else:
+            kind = 'post' if self.current_function == "profile" else 'like'
+            user_id = self.extract_user_id(self.url_input.text().strip())
+            if not user_id:
+                self.status_label.setText("无法识别用户ID")
+                return
+        if not self.browser_cookies:
+            self.status_label.setText("未获取到Cookie，请先加载页面并登录")
+            return
+
+        self.browser.reset_captured_data()
+        self.crawler_thread = QThread()
+        self.crawler = DouyinApiCrawler(kind, user_id, self.browser_cookies)
+        self.crawler.moveToThread(self.crawler_thread)
+        self.crawler.json_received.connect(self.browser.handle_json_response)
+        self.crawler.json_received.connect(self.extractor.process_packet)
+        self.crawler.page_fetched.connect(
+            lambda pages, items: self.status_label.setText(f"接口抓取中: 第 {pages} 页，共 {items} 个视频")
+        )
+        self.crawler.crawl_finished.connect(self.finish_api_crawl)
+        self.crawler_thread.started.connect(self.crawler.run)
+        self.crawler_thread.start()
+        self.api_crawl_button.setText("停止抓取")
+
+    def finish_api_crawl(self, success, message):
+        self.crawler_thread.quit()
+        self.crawler_thread.wait()
+        self.api_crawl_button.setText("接口翻页抓取")
+        self.status_label.setText(("接口抓取完成: " if success else "接口抓取中断: ") + message)
+        if self.video_data:
+            self.finish_extraction()
+
     def extract_user_id(self, input_text):
-        """从用户输入中提取用户ID"""
-        # 如果输入的是完整URL
-        if "douyin.com/user/" in input_text:
-            # 提取URL中最后的用户ID部分
-            user_id = input_text.split("/user/")[-1].split("?")[0].strip()
-            return user_id
-        # 如果输入的就是用户ID
-        return input_text.strip()
+        return extract_user_id(input_text)
 
     def select_function(self, function_type):
+        self.ensure_browser()
         self.url_input.setEnabled(True)
         self.load_button.setEnabled(True)
+        self.api_crawl_button.setEnabled(True)
         self.current_function = function_type  # 保存当前选择的功能
         
         if function_type == "favorite":
@@ -1167,43 +3169,20 @@ class MainWindow(QMainWindow):
         self.save_button.setEnabled(False)
         self.video_data = []
 
+    def on_packet_processed(self, added, total):
+        if added:
+            self.status_label.setText(f"已自动添加 {added} 个新视频到下载中心，本次共 {len(self.video_data)} 个视频")
+        self.extract_button.setEnabled(True)
+        self.save_button.setEnabled(bool(self.video_data))
+
     def extract_videos(self):
-        if not self.browser.captured_data:
+        # 数据包到达时已经在后台提取并加入下载队列，这里只汇总结果
+        if not self.video_data:
             self.status_label.setText("未捕获到任何数据")
             return
-        
-        self.status_label.setText("正在提取视频数据...")
-        self.progress_bar.setVisible(True)
-        self.progress_bar.setValue(0)
-        
-        # 注意：这里不再清空 self.video_data，而是追加新数据
-        previous_count = len(self.video_data)
-        
-        # 创建后台线程处理数据
-        self.extraction_thread = QThread()
-        
-        # 处理所有捕获的数据包（不仅仅是最后一个）
-        self.extractor = DouyinDataExtractor(self.browser.captured_data)
-        self.extractor.moveToThread(self.extraction_thread)
-        
-        # 连接信号
-        self.extractor.data_extracted.connect(self.handle_video_data)
-        self.extractor.progress_updated.connect(self.update_progress)
-        self.extractor.extraction_complete.connect(self.finish_extraction)
-        
-        self.extraction_thread.started.connect(self.extractor.extract_videos)
-        self.extraction_thread.start()
-    
-    def update_progress(self, current, total):
-        self.progress_bar.setMaximum(total)
-        self.progress_bar.setValue(current)
-        self.status_label.setText(f"正在处理视频: {current}/{total}")
+        self.finish_extraction()
     
     def finish_extraction(self):
-        if self.extraction_thread:
-            self.extraction_thread.quit()
-            self.extraction_thread.wait()
-        self.progress_bar.setVisible(False)
         self.status_label.setText(f"提取完成! 共找到 {len(self.video_data)} 个不重复的视频，已全部添加到下载中心。")
         self.save_button.setEnabled(bool(self.video_data))
         self.tab_widget.setCurrentIndex(1) # 自动切换到下载中心
@@ -1214,11 +3193,11 @@ class MainWindow(QMainWindow):
         
         try:
             with open("douyin_videos.txt", "w", encoding="utf-8") as f:
-                for title, url, metadata in self.video_data:
-                    f.write(f"标题: {title}\n")
-                    f.write(f"作者: {metadata['author']}\n")
-                    f.write(f"视频ID: {metadata['aweme_id']}\n")
-                    f.write(f"链接: {url}\n")
+                for video in self.video_data:
+                    f.write(f"标题: {video.title}\n")
+                    f.write(f"作者: {video.author}\n")
+                    f.write(f"视频ID: {video.aweme_id}\n")
+                    f.write(f"链接: {video.url}\n")
                     f.write("-" * 50 + "\n")
             
             self.status_label.setText("数据已保存到 douyin_videos.txt")
@@ -1226,33 +3205,300 @@ class MainWindow(QMainWindow):
             self.status_label.setText(f"保存失败: {str(e)}")
 
     def closeEvent(self, event):
+        # 保存进度后停止持久化，任务在数据库中保持关闭前的状态，下次启动时恢复
+        self.download_manager.flush_progress_to_store()
+        self.download_manager.store = None
+
         # 清理所有下载任务
         for task_id, task in list(self.download_manager.tasks.items()):
             task.cleanup()
         
         # 等待所有线程结束
+        self.download_manager.queued.clear()
         for task in self.download_manager.tasks.values():
             if task.thread and task.thread.isRunning():
                 task.thread.quit()
                 task.thread.wait()
         
-        # 清理提取线程
-        if self.extraction_thread and self.extraction_thread.isRunning():
-            self.extraction_thread.quit()
-            self.extraction_thread.wait()
+        self.task_store.close()
+        self.seen_index.save()
+
+        # 停止接口抓取线程
+        if self.crawler_thread and self.crawler_thread.isRunning():
+            self.crawler.stop()
+            self.crawler_thread.quit()
+            self.crawler_thread.wait()
+
+        # 清理提取线程和链接刷新线程
+        for thread in (self.extraction_thread, self.refresh_thread):
+            if thread and thread.isRunning():
+                thread.quit()
+                thread.wait()
         
         event.accept()
 
-if __name__ == "__main__":
-    app.setStyle("Fusion")
-    app.setStyleSheet(MODERN_DARK_STYLE)
-    
+def load_cookie_file(path):
+    """读取Cookie文件，支持浏览器导出的Netscape cookies.txt和JSON（字典或[{name, value}]列表）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    cookies = {}
+    stripped = text.lstrip()
+    if stripped.startswith('{') or stripped.startswith('['):
+        data = json.loads(stripped)
+        if isinstance(data, dict):
+            return {str(k): str(v) for k, v in data.items()}
+        for item in data:
+            if 'douyin.com' in item.get('domain', 'douyin.com'):
+                cookies[item['name']] = str(item.get('value', ''))
+        return cookies
+    for line in text.splitlines():
+        if line.startswith('#HttpOnly_'):
+            line = line[len('#HttpOnly_'):]
+        elif not line.strip() or line.startswith('#'):
+            continue
+        fields = line.split('\t')
+        if len(fields) >= 7 and 'douyin.com' in fields[0]:
+            cookies[fields[5]] = fields[6]
+        elif '=' in line and len(fields) == 1:
+            # 也接受从请求头复制的 "name=value; name2=value2"
+            for pair in line.split(';'):
+                name, _, value = pair.strip().partition('=')
+                if name:
+                    cookies[name] = value
+    return cookies
+
+def load_packet_dump(path):
+    """读取保存下来的列表接口数据包：单个JSON、JSON数组或每行一个JSON"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    try:
+        data = json_loads(raw)
+    except ValueError:
+        return [json_loads(line) for line in raw.splitlines() if line.strip()]
+    return data if isinstance(data, list) else [data]
+
+class HeadlessRunner(QObject):
+    """命令行模式：不创建窗口、不加载浏览器，用与图形界面相同的提取和下载逻辑批量下载"""
+
+    def __init__(self, args):
+        super().__init__()
+        self.args = args
+        self.cookies = load_cookie_file(args.cookies) if args.cookies else {}
+        self.store, self.seen = open_task_store()
+        self.manager = DownloadManager(args.output, max_concurrent=args.concurrency, per_host_limit=args.per_host,
+                                       segments=args.segments, backend=args.backend,
+                                       store=self.store, seen=self.seen)
+        self.manager.set_bandwidth_limit(args.limit)
+        self.extractor = DouyinDataExtractor(seen=self.seen)
+        self.extractor.stream_policy = args.quality
+        self.extractor.data_extracted.connect(self.add_video)
+        self.refresh_thread = QThread()
+        self.url_refresher = UrlRefresher(self.extractor.parse_aweme, self.cookies)
+        self.url_refresher.moveToThread(self.refresh_thread)
+        self.manager.url_refresh_needed.connect(self.url_refresher.request)
+        self.url_refresher.refreshed.connect(self.manager.apply_refreshed_url)
+        self.crawler_thread = None
+        self.crawler = None
+        self.input_done = False
+        self.added = self.finished = self.failed = 0
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setInterval(500)
+        self.idle_timer.timeout.connect(self.check_done)
+        self.exit_code = 0
+
+    def start(self):
+        self.refresh_thread.start()
+        self.idle_timer.start()
+        for path in self.args.dump or []:
+            packets = load_packet_dump(path)
+            for packet in packets:
+                self.extractor.process_packet(packet)
+            cli_log.info("已读取 %s: %d 个数据包", path, len(packets))
+        if self.args.target:
+            self.start_crawler()
+        else:
+            self.input_done = True
+
+    def start_crawler(self):
+        kind = {'collection': 'collection', 'profile': 'post', 'like': 'like'}[self.args.target]
+        user_id = extract_user_id(self.args.user or '')
+        if kind != 'collection' and not user_id:
+            cli_log.error("主页和喜欢需要通过 --user 指定用户主页链接或sec_user_id")
+            self.input_done = True
+            self.exit_code = 2
+            return
+        if not self.cookies:
+            cli_log.warning("未提供Cookie，接口可能返回空数据")
+        self.crawler_thread = QThread()
+        self.crawler = DouyinApiCrawler(kind, user_id, self.cookies)
+        self.crawler.moveToThread(self.crawler_thread)
+        self.crawler.json_received.connect(self.extractor.process_packet)
+        self.crawler.page_fetched.connect(
+            lambda pages, items: cli_log.info("接口抓取中: 第 %d 页，共 %d 个视频", pages, items))
+        self.crawler.crawl_finished.connect(self.finish_crawl)
+        self.crawler_thread.started.connect(self.crawler.run)
+        self.crawler_thread.start()
+
+    def finish_crawl(self, success, message):
+        self.crawler_thread.quit()
+        self.crawler_thread.wait()
+        if success:
+            cli_log.info("接口抓取完成: %s", message)
+        else:
+            cli_log.warning("接口抓取中断: %s", message)
+        if not success:
+            self.exit_code = 1
+        self.input_done = True
+
+    def add_video(self, video):
+        task_id = self.manager.add_task(video.url, video.title, video.aweme_id, video.to_metadata(),
+                                        mirrors=video.mirrors)
+        task = self.manager.tasks[task_id]
+        if task.is_completed:
+            return
+        self.added += 1
+        task.download_finished.connect(self.on_task_finished)
+        self.manager.start_task(task_id)
+
+    def on_task_finished(self, task_id, success):
+        if not success and self.manager.is_retry_pending(task_id):
+            return
+        task = self.manager.tasks.get(task_id)
+        if success:
+            self.finished += 1
+        else:
+            self.failed += 1
+        title = task.title if task is not None else task_id
+        # 成功的逐条消息默认不输出，失败总是输出
+        cli_log.log(logging.DEBUG if success else logging.WARNING, "[%d/%d] %s: %s",
+                    self.finished + self.failed, self.added, '完成' if success else '失败', title,
+                    extra={'task_id': task_id})
+
+    def check_done(self):
+        self.manager.flush_progress_to_store()
+        if self.input_done and self.manager.is_idle():
+            self.stop()
+
+    def stop(self):
+        """保存进度并退出；被中断时未完成的任务保持排队状态，下次可以继续"""
+        self.idle_timer.stop()
+        if self.crawler_thread and self.crawler_thread.isRunning():
+            self.crawler.stop()
+            self.crawler_thread.quit()
+            self.crawler_thread.wait()
+        self.manager.flush_progress_to_store()
+        self.manager.store = None
+        self.manager.queued.clear()
+        for task in self.manager.tasks.values():
+            task.cleanup()
+        self.store.close()
+        self.seen.save()
+        self.refresh_thread.quit()
+        self.refresh_thread.wait()
+        cli_log.info("新增 %d 个视频，完成 %d 个，失败 %d 个", self.added, self.finished, self.failed)
+        if self.failed:
+            self.exit_code = self.exit_code or 1
+        QCoreApplication.instance().exit(self.exit_code)
+
+def parse_args(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description="抖音收藏/主页/喜欢视频批量下载")
+    parser.add_argument('--headless', action='store_true', help="命令行模式，不打开窗口和浏览器")
+    parser.add_argument('--cookies', help="Cookie文件（cookies.txt或JSON）")
+    parser.add_argument('--target', choices=['collection', 'profile', 'like'], help="要抓取的列表")
+    parser.add_argument('--user', help="用户主页链接或sec_user_id（profile/like需要）")
+    parser.add_argument('--dump', nargs='+', help="直接处理保存的列表接口JSON数据包文件")
+    parser.add_argument('--output', default=os.path.join(os.path.expanduser("~"), "Downloads", "douyin_videos"),
+                        help="下载目录")
+    parser.add_argument('--concurrency', type=int, default=5, help="同时下载数量")
+    parser.add_argument('--per-host', type=int, default=3, help="单个CDN主机同时下载数量，0为不限制")
+    parser.add_argument('--segments', type=int, default=1, help="大文件分段数")
+    parser.add_argument('--backend', choices=list(DOWNLOAD_BACKENDS), default='thread', help="下载引擎")
+    parser.add_argument('--limit', type=int, default=0, help="全局限速 KB/s，0为不限速")
+    parser.add_argument('--quality', choices=list(STREAM_POLICIES), default=DEFAULT_STREAM_POLICY,
+                        help="画质策略")
+    parser.add_argument('--measure-startup', action='store_true', help="统计图形界面各启动阶段的耗时后退出")
+    parser.add_argument('--eager-browser', action='store_true', help="与 --measure-startup 一起使用，启动时立即创建浏览器")
+    parser.add_argument('--log-level', default='INFO',
+                        help="日志级别，可按子系统分别设置，例如 WARNING,download=DEBUG"
+                             f"（子系统: {', '.join(LOG_SUBSYSTEMS)}）")
+    parser.add_argument('--log-file', help="同时把日志写入文件")
+    parser.add_argument('--log-format', choices=['text', 'json'], default='text', help="日志格式")
+    args, qt_args = parser.parse_known_args(argv)  # 图形界面把其余参数留给Qt，例如 -style
+    if args.headless and qt_args:
+        # 命令行模式不经过Qt，拼错的参数（如 --ouptut）不能被悄悄忽略
+        parser.error(f"无法识别的参数: {' '.join(qt_args)}")
+    try:
+        parse_log_levels(args.log_level)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.headless and not args.target and not args.dump:
+        parser.error("命令行模式需要 --target 或 --dump")
+    return args
+
+def run_headless(args):
+    import signal
+    qt_app = QCoreApplication(sys.argv[:1])
+    runner = HeadlessRunner(args)
+    # Ctrl+C时保存进度后退出；runner的定时器会定期把控制权交回Python，信号才能被及时处理
+    signal.signal(signal.SIGINT, lambda *_: runner.stop())
+    QTimer.singleShot(0, runner.start)
+    return qt_app.exec_()
+
+def create_application():
+    """初始化图形界面：Qt属性必须在创建QApplication之前设置
+
+    设置了AA_ShareOpenGLContexts后，WebEngine可以在QApplication之后再导入，
+    因此它推迟到第一次使用抓取功能时（MainWindow.ensure_browser）才加载。
+    """
+    os.environ["QT_AUTO_SCREEN_SCALE_FACTOR"] = "0"  # 禁用自动高DPI缩放
+    os.environ["QT_QUICK_BACKEND"] = "software"  # 添加软件渲染
+    QApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
+    QApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
+    qt_app = QApplication(sys.argv)
+    qt_app.setStyle("Fusion")
+    qt_app.setStyleSheet(MODERN_DARK_STYLE)
+    return qt_app
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    setup_logging(args.log_level, args.log_file, args.log_format)
+    if args.headless:
+        return run_headless(args)
+
+    if args.measure_startup:
+        return measure_startup(args)
+
+    qt_app = create_application()
     window = MainWindow()
     window.show()
-    
-    # 自动启用提取按钮当捕获到数据时
-    window.browser.custom_page.json_received.connect(
-        lambda: window.extract_button.setEnabled(True)
-    )
-    
-    sys.exit(app.exec_())
+    return qt_app.exec_()
+
+def measure_startup(args):
+    """统计启动各阶段耗时后退出；加 --eager-browser 可与启动时就创建浏览器的旧方式对比"""
+    marks = [("导入模块", time.perf_counter())]
+    qt_app = create_application()
+    marks.append(("创建QApplication", time.perf_counter()))
+    window = MainWindow()
+    marks.append(("构建主窗口", time.perf_counter()))
+    if args.eager_browser:
+        window.ensure_browser()
+        marks.append(("启动内置浏览器", time.perf_counter()))
+    window.show()
+
+    def first_paint():
+        marks.append(("首次显示窗口", time.perf_counter()))
+        previous = STARTUP_TIME
+        for name, mark in marks:
+            print(f"{name}: {(mark - previous) * 1000:.0f} ms")
+            previous = mark
+        print(f"合计: {(marks[-1][1] - STARTUP_TIME) * 1000:.0f} ms")
+        window.close()
+        qt_app.quit()
+
+    # 事件循环处理完显示和首次绘制事件后才会执行这个定时器
+    QTimer.singleShot(0, first_paint)
+    return qt_app.exec_()
+
+if __name__ == "__main__":
+    sys.exit(main())
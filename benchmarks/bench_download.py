@@ -0,0 +1,222 @@
+"""下载层性能测试：用本地模拟CDN测量DownloadTask/DownloadManager的吞吐量
+
+对每个任务数量（默认10到5000）跑一批下载，报告 MB/s、任务完成时间的p50/p99、
+峰值线程数和峰值内存。结果可以保存为JSON，下次用 --compare 对比前后两次的差异。
+
+示例:
+    python benchmarks/bench_download.py --tasks 10 100 1000 --size 256k --latency 0.02
+    python benchmarks/bench_download.py --backend asyncio --fail-5xx 0.05 --json after.json --compare before.json
+    python benchmarks/bench_download.py --tasks 20 --size 4MB --bandwidth 2MB --pause-interval 0.2 --verify
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QCoreApplication, QTimer
+
+import app
+from mock_cdn import CdnConfig, expected_digest, make_server, parse_size
+
+def read_proc_status():
+    """返回 (线程数, 常驻内存字节数)，非Linux系统退回到Python线程数和getrusage"""
+    try:
+        values = {}
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                values[key] = value.split()
+        return int(values['Threads'][0]), int(values['VmRSS'][0]) * 1024
+    except (OSError, KeyError, ValueError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return threading.active_count(), rss if sys.platform == 'darwin' else rss * 1024
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def run_batch(qt_app, config, base_url, count, args):
+    """下载count个文件，返回本批的统计结果"""
+    sizes = [parse_size(size) for size in args.size]
+    names = []
+    for index in range(count):
+        name = f"b{count}_{index}.mp4"
+        config.add_file(name, sizes[index % len(sizes)])
+        names.append(name)
+
+    out_dir = tempfile.mkdtemp(prefix="douyin_bench_")
+    manager = app.DownloadManager(out_dir, max_concurrent=args.concurrency, per_host_limit=0,
+                                  segments=args.segments, segment_threshold=parse_size(args.segment_threshold),
+                                  backend=args.backend,
+                                  retry_policy=app.RetryPolicy(args.max_attempts, base_delay=0.05, max_delay=0.5))
+    app.global_bandwidth.set_rate(parse_size(args.limit))
+    finished = {}
+    started = time.perf_counter()
+    bytes_done = [0]
+    errors = [0]
+    samples = {'threads': 0, 'rss': 0}
+    rng = random.Random(count)
+    paused = set()
+
+    def on_status(task_id, status):
+        if status.startswith("错误"):
+            errors[0] += 1
+
+    def on_finished(task_id, success):
+        if not success and manager.is_retry_pending(task_id):
+            return
+        finished[task_id] = (success, time.perf_counter() - started)
+        task = manager.tasks[task_id]
+        if success:
+            bytes_done[0] += task.total_size
+            if args.verify and task.content_hash != expected_digest(names[int(task_id)],
+                                                                   config.files[names[int(task_id)]]):
+                finished[task_id] = (False, finished[task_id][1])
+                print(f"校验失败: {names[int(task_id)]}")
+            if not args.keep_files:
+                os.remove(task.file_path)
+
+    def sample():
+        threads, rss = read_proc_status()
+        samples['threads'] = max(samples['threads'], threads)
+        samples['rss'] = max(samples['rss'], rss)
+        if len(finished) == count:
+            qt_app.quit()
+
+    def pause_one():
+        """暂停一个正在下载、之前没有暂停过的任务，稍后继续，检查暂停/继续不会让任务出错"""
+        candidates = sorted(manager.active - paused)
+        if not candidates:
+            return
+        task_id = rng.choice(candidates)
+        paused.add(task_id)
+        manager.pause_task(task_id)
+        QTimer.singleShot(int(args.pause_interval * 500), lambda: manager.start_task(task_id))
+
+    for index, name in enumerate(names):
+        task_id = manager.add_task(base_url + config.url_path(name), f"bench_{index}", str(index))
+        manager.tasks[task_id].download_finished.connect(on_finished)
+        manager.tasks[task_id].status_updated.connect(on_status)
+    for task_id in list(manager.tasks):
+        manager.start_task(task_id)
+
+    timer = QTimer()
+    timer.timeout.connect(sample)
+    timer.start(50)
+    pauser = QTimer()
+    if args.pause_interval:
+        pauser.timeout.connect(pause_one)
+        pauser.start(int(args.pause_interval * 1000))
+    QTimer.singleShot(int(args.timeout * 1000), qt_app.quit)
+    qt_app.exec_()
+    timer.stop()
+    pauser.stop()
+    elapsed = time.perf_counter() - started
+
+    for task in manager.tasks.values():
+        task.cleanup()
+    shutil.rmtree(out_dir, ignore_errors=True)
+
+    durations = [duration for success, duration in finished.values() if success]
+    return {
+        'tasks': count,
+        'completed': len(durations),
+        'failed': sum(1 for success, _ in finished.values() if not success),
+        'unfinished': count - len(finished),
+        'seconds': round(elapsed, 3),
+        'mb_per_sec': round(bytes_done[0] / 1024 / 1024 / elapsed, 2) if elapsed else 0.0,
+        'p50': round(percentile(durations, 0.5), 3),
+        'p99': round(percentile(durations, 0.99), 3),
+        'peak_threads': samples['threads'],
+        'peak_rss_mb': round(samples['rss'] / 1024 / 1024, 1),
+        'errors': errors[0],
+    }
+
+COLUMNS = ['tasks', 'completed', 'failed', 'seconds', 'mb_per_sec', 'p50', 'p99', 'peak_threads', 'peak_rss_mb',
+           'errors']
+
+def print_table(results, baseline=None, columns=COLUMNS, key='tasks', first_delta=3):
+    """打印结果表格，有baseline时在每行下面显示与之前结果的变化比例"""
+    print("  ".join(f"{column:>12}" for column in columns))
+    previous = {row[key]: row for row in (baseline or {}).get('results', [])}
+    for row in results:
+        print("  ".join(f"{row[column]:>12}" for column in columns))
+        old = previous.get(row[key])
+        if old:
+            deltas = []
+            for column in columns[first_delta:]:
+                if old.get(column):
+                    deltas.append(f"{(row[column] - old[column]) / old[column] * 100:+.0f}%")
+                else:
+                    deltas.append("-")
+            print("  ".join(f"{'':>12}" for _ in columns[:first_delta]) + "  " +
+                  "  ".join(f"{d:>12}" for d in deltas))
+
+def main():
+    parser = argparse.ArgumentParser(description="下载层性能测试（本地模拟CDN）")
+    parser.add_argument('--tasks', type=int, nargs='+', default=[10, 100, 1000, 5000], help="每批的任务数量")
+    parser.add_argument('--size', nargs='+', default=['256k'], help="文件大小，多个值时轮流使用")
+    parser.add_argument('--latency', type=float, default=0.0, help="首字节延迟（秒）")
+    parser.add_argument('--bandwidth', default='0', help="CDN单连接带宽，例如 4MB，0为不限")
+    parser.add_argument('--no-range', action='store_true', help="CDN不支持Range请求")
+    parser.add_argument('--fail-403', type=float, default=0.0, help="永久返回403的文件比例")
+    parser.add_argument('--fail-5xx', type=float, default=0.0, help="每个请求返回503的概率")
+    parser.add_argument('--redirect', type=float, default=0.0, help="经过302重定向的文件比例")
+    parser.add_argument('--backend', choices=list(app.DOWNLOAD_BACKENDS), default='thread')
+    parser.add_argument('--concurrency', type=int, default=5)
+    parser.add_argument('--segments', type=int, default=1)
+    parser.add_argument('--segment-threshold', default='8MB')
+    parser.add_argument('--limit', default='0', help="全局限速，例如 10MB，0为不限")
+    parser.add_argument('--max-attempts', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=600, help="每批最长运行时间（秒）")
+    parser.add_argument('--pause-interval', type=float, default=0,
+                        help="每隔多少秒暂停一个下载中的任务（每个任务最多一次）并在半个间隔后继续，0为不暂停；"
+                             "没有注入故障时出现下载错误则退出码为1")
+    parser.add_argument('--verify', action='store_true', help="校验每个文件的内容摘要")
+    parser.add_argument('--keep-files', action='store_true', help="不删除已下载的文件")
+    parser.add_argument('--json', help="把结果写入JSON文件")
+    parser.add_argument('--compare', help="与之前保存的JSON结果对比")
+    parser.add_argument('--quiet', action='store_true', help="只显示错误日志，等同于 --log-level ERROR")
+    parser.add_argument('--log-level', default='WARNING', help="日志级别，例如 INFO 或 WARNING,download=DEBUG")
+    args = parser.parse_args()
+
+    app.setup_logging('ERROR' if args.quiet else args.log_level)
+    qt_app = QCoreApplication(sys.argv[:1])
+    config = CdnConfig(args.latency, parse_size(args.bandwidth), not args.no_range,
+                       args.fail_403, args.fail_5xx, args.redirect)
+    server, base_url = make_server(config)
+
+    results = []
+    for count in args.tasks:
+        print(f"运行 {count} 个任务...", file=sys.stderr)
+        results.append(run_batch(qt_app, config, base_url, count, args))
+    server.shutdown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+    print(f"CDN统计: {config.stats}")
+    if args.json:
+        settings = {key: value for key, value in vars(args).items()
+                    if key not in ('json', 'compare', 'quiet', 'log_level')}
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'settings': settings, 'results': results}, f, ensure_ascii=False, indent=2)
+    if args.pause_interval and not (args.fail_403 or args.fail_5xx) and any(row['errors'] for row in results):
+        print("暂停/继续的任务出现了下载错误", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""提取器性能测试：测量DouyinDataExtractor解析aweme_list的速度和内存，并校验结果
+
+先用 benchmarks/corpus/ 中的固定语料按每种画质策略解析一遍，与 golden.json 逐条对比
+选中的链接、镜像和流，防止优化提取器时悄悄改变了挑选结果；然后用合成数据包按批次
+（默认1000到50000个视频）测量每秒处理的视频数、峰值内存和保留的VideoRecord占用。
+
+示例:
+    python benchmarks/bench_extractor.py --items 1000 10000 50000 --json before.json
+    python benchmarks/bench_extractor.py --mode raw --compare before.json
+    python benchmarks/bench_extractor.py --update-golden   # 有意修改挑选逻辑后重新生成
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from bench_download import print_table, read_proc_status
+from extractor_corpus import GOLDEN_FILE, load_corpus, synthetic_packets
+
+def record_summary(record):
+    """golden中保存的字段：影响下载结果的链接和流信息"""
+    stream = record.stream or {}
+    return {
+        'aweme_id': str(record.aweme_id),
+        'title': record.title,
+        'url': record.url,
+        'mirrors': record.mirrors,
+        'url_type': record.url_type,
+        'gear_name': stream.get('gear_name', ''),
+        'resolution': stream.get('resolution', 0),
+        'codec': stream.get('codec', ''),
+        'bitrate': stream.get('bitrate', 0),
+    }
+
+def run_extractor(packets, mode, policy=app.DEFAULT_STREAM_POLICY):
+    """用新的提取器处理packets，返回提取出的VideoRecord列表
+
+    mode: packet 逐个调用process_packet；raw 传入JSON文本经process_raw解析；
+    batch 使用extract_videos一次处理全部数据包（不去重）
+    """
+    records = []
+    extractor = app.DouyinDataExtractor(packets if mode == 'batch' else None, app.SeenIndex())
+    extractor.stream_policy = policy
+    extractor.data_extracted.connect(records.append)
+    if mode == 'batch':
+        extractor.extract_videos()
+    elif mode == 'raw':
+        for text in packets:
+            extractor.process_raw(text)
+    else:
+        for packet in packets:
+            extractor.process_packet(packet)
+    return records
+
+def golden_output():
+    """固定语料在每种画质策略下的提取结果"""
+    corpus = load_corpus()
+    output = {}
+    for policy in app.STREAM_POLICIES:
+        output[policy] = {name: [record_summary(r) for r in run_extractor(packets, 'packet', policy)]
+                          for name, packets in corpus}
+    return output
+
+def write_golden(output):
+    """每条记录占一行，修改挑选逻辑后的diff容易阅读"""
+    with open(GOLDEN_FILE, 'w', encoding='utf-8') as f:
+        f.write("{\n")
+        for i, (policy, files) in enumerate(output.items()):
+            f.write(f' {json.dumps(policy)}: {{\n')
+            for j, (name, records) in enumerate(files.items()):
+                lines = ",\n".join(f"   {json.dumps(r, ensure_ascii=False)}" for r in records)
+                f.write(f'  {json.dumps(name)}: [\n{lines}\n  ]{"," if j < len(files) - 1 else ""}\n')
+            f.write(f' }}{"," if i < len(output) - 1 else ""}\n')
+        f.write("}\n")
+
+def compare_golden(expected, actual, limit=20):
+    """返回差异描述列表，为空表示结果一致"""
+    problems = []
+    for policy in sorted(set(expected) | set(actual)):
+        for name in sorted(set(expected.get(policy, {})) | set(actual.get(policy, {}))):
+            old = {r['aweme_id']: r for r in expected.get(policy, {}).get(name, [])}
+            new = {r['aweme_id']: r for r in actual.get(policy, {}).get(name, [])}
+            for aweme_id in sorted(set(old) | set(new)):
+                if aweme_id not in new:
+                    problems.append(f"{policy}/{name} {aweme_id}: 不再被提取")
+                elif aweme_id not in old:
+                    problems.append(f"{policy}/{name} {aweme_id}: 新提取出的视频")
+                else:
+                    for key in old[aweme_id]:
+                        if old[aweme_id][key] != new[aweme_id].get(key):
+                            problems.append(f"{policy}/{name} {aweme_id}: {key} "
+                                            f"{old[aweme_id][key]!r} -> {new[aweme_id].get(key)!r}")
+    if len(problems) > limit:
+        problems = problems[:limit] + [f"... 共{len(problems)}处差异"]
+    return problems
+
+def run_batch(count, args):
+    """解析约count个视频，返回本批的统计结果"""
+    packets = synthetic_packets(count, page_size=args.page_size, seed=args.seed)
+    if args.mode == 'raw':
+        packets = [json.dumps(packet, ensure_ascii=False) for packet in packets]
+    gc.collect()
+    _, rss_before = read_proc_status()
+
+    best = None
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        records = run_extractor(packets, args.mode, args.quality)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    _, rss_after = read_proc_status()
+    del records
+    gc.collect()
+
+    # 内存单独跑一遍，tracemalloc本身会明显拖慢解析
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    records = run_extractor(packets, args.mode, args.quality)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'items': count,
+        'extracted': len(records),
+        'mode': args.mode,
+        'seconds': round(best, 3),
+        'items_per_sec': round(count / best) if best else 0,
+        'peak_mb': round((peak - baseline) / 1024 / 1024, 2),
+        'retained_mb': round((retained - baseline) / 1024 / 1024, 2),
+        'bytes_per_item': round((retained - baseline) / len(records)) if records else 0,
+        'rss_delta_mb': round((rss_after - rss_before) / 1024 / 1024, 1),
+    }
+
+COLUMNS = ['items', 'extracted', 'mode', 'seconds', 'items_per_sec', 'peak_mb', 'retained_mb',
+           'bytes_per_item', 'rss_delta_mb']
+
+def main():
+    parser = argparse.ArgumentParser(description="提取器性能测试和结果校验")
+    parser.add_argument('--items', type=int, nargs='+', default=[1000, 10000, 50000], help="每批的视频数量")
+    parser.add_argument('--mode', choices=['packet', 'raw', 'batch'], default='packet',
+                        help="packet: process_packet；raw: 包含JSON解析；batch: extract_videos")
+    parser.add_argument('--quality', choices=list(app.STREAM_POLICIES), default=app.DEFAULT_STREAM_POLICY)
+    parser.add_argument('--page-size', type=int, default=18, help="每个数据包中的视频数")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--repeat', type=int, default=3, help="每批重复次数，取最快的一次")
+    parser.add_argument('--skip-check', action='store_true', help="不校验固定语料的结果")
+    parser.add_argument('--check-only', action='store_true', help="只校验固定语料的结果")
+    parser.add_argument('--update-golden', action='store_true', help="用当前提取器的结果覆盖golden.json")
+    parser.add_argument('--log-level', default='WARNING',
+                        help="日志级别；extractor=DEBUG 会输出逐个视频的日志，测试结果包含其开销")
+    parser.add_argument('--json', help="把结果写入JSON文件")
+    parser.add_argument('--compare', help="与之前保存的JSON结果对比")
+    args = parser.parse_args()
+    app.setup_logging(args.log_level)
+
+    if args.update_golden:
+        write_golden(golden_output())
+        print(f"已更新 {GOLDEN_FILE}")
+        return 0
+
+    if not args.skip_check:
+        with open(GOLDEN_FILE, 'r', encoding='utf-8') as f:
+            expected = json.load(f)
+        problems = compare_golden(expected, golden_output())
+        if problems:
+            print("提取结果与golden.json不一致:")
+            for problem in problems:
+                print(f"  {problem}")
+            return 1
+        print(f"固定语料校验通过（{len(expected)}种画质策略）", file=sys.stderr)
+        if args.check_only:
+            return 0
+
+    results = []
+    for count in args.items:
+        print(f"解析 {count} 个视频...", file=sys.stderr)
+        results.append(run_batch(count, args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_table(results, baseline, COLUMNS, key='items', first_delta=3)
+    if args.json:
+        settings = {key: value for key, value in vars(args).items()
+                    if key not in ('json', 'compare', 'update_golden')}
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'settings': settings, 'results': results}, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""合成的、已匿名化的aweme_list数据包，用于提取器的性能测试和结果校验
+
+覆盖三种列表接口的响应结构（post、favorite、listcollection）以及常见的边界情况：
+缺少play_addr、只有bit_rate、只有download_addr、协议相对地址、带水印参数、
+H.264/H.265多码率、缺少宽高、空url_list、没有视频的图文、空描述、author/desc为null、
+数字类型的aweme_id和跨页重复的aweme_id。
+所有ID、昵称和域名都是虚构的。
+
+重新生成固定语料: python benchmarks/extractor_corpus.py
+"""
+import json
+import os
+import random
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+CORPUS_FILES = ("post.json", "favorite.json", "listcollection.json")
+GOLDEN_FILE = os.path.join(CORPUS_DIR, "golden.json")
+
+CDN_HOSTS = ("v3-web.example-vod.com", "v26-web.example-vod.com", "v9-cold.example-vod.com")
+
+def _urls(rng, aweme_id, tag, protocol_relative=False, watermark=False, count=3):
+    urls = []
+    for host in rng.sample(CDN_HOSTS, count):
+        url = f"{'' if protocol_relative else 'https:'}//{host}/video/tos/{aweme_id}/{tag}/?a=6383&br={rng.randint(500, 4000)}"
+        if watermark:
+            url += "&watermark=1&logo_name=aweme"
+        urls.append(url)
+    return urls
+
+def _addr(rng, aweme_id, tag, width, height, data_size, **kwargs):
+    addr = {
+        "uri": f"v0200fg10000{aweme_id}{tag}",
+        "url_list": _urls(rng, aweme_id, tag, **kwargs),
+        "data_size": data_size,
+    }
+    if width:
+        addr["width"] = width
+        addr["height"] = height
+    return addr
+
+def _bit_rates(rng, aweme_id, missing_size=False, empty_first=False):
+    variants = []
+    for index, (short, bitrate, h265) in enumerate(((1080, 2800000, 0), (1080, 1900000, 1),
+                                                     (720, 1200000, 0), (720, 800000, 1), (540, 550000, 0))):
+        width, height = (short, short * 16 // 9) if not missing_size else (0, 0)
+        addr = _addr(rng, aweme_id, f"br{index}", width, height, bitrate // 8 * 15,
+                     protocol_relative=index % 2 == 1)
+        if empty_first and index == 0:
+            addr["url_list"] = []
+        variants.append({
+            "gear_name": f"{'adapt' if h265 else 'normal'}_{short}_0",
+            "quality_type": 10 + index,
+            "bit_rate": bitrate,
+            "is_h265": h265,
+            "is_bytevc1": h265,
+            "FPS": 30,
+            "play_addr": addr,
+        })
+    rng.shuffle(variants)
+    return variants
+
+def make_aweme(rng, aweme_id, case):
+    """按case生成一个aweme，case为下面CASES中的名称"""
+    aweme = {
+        "aweme_id": str(aweme_id),
+        "desc": f"测试视频 {aweme_id} #话题{aweme_id % 7}",
+        "create_time": 1700000000 + aweme_id % 100000,
+        "author": {"uid": str(aweme_id * 7 % 10 ** 12), "nickname": f"作者{aweme_id % 97}"},
+        "statistics": {"digg_count": aweme_id % 1000},
+    }
+    play_addr = _addr(rng, aweme_id, "play", 1080, 1920, 3500000)
+    download_addr = _addr(rng, aweme_id, "dl", 720, 1280, 2600000, watermark=True)
+    video = {"duration": 15000, "width": 1080, "height": 1920}
+
+    if case == "full":
+        video.update(play_addr=play_addr, download_addr=download_addr, bit_rate=_bit_rates(rng, aweme_id))
+    elif case == "no_play_addr":
+        video.update(download_addr=download_addr, bit_rate=_bit_rates(rng, aweme_id))
+    elif case == "bit_rate_only":
+        video.update(bit_rate=_bit_rates(rng, aweme_id, empty_first=True))
+    elif case == "protocol_relative":
+        video.update(play_addr=_addr(rng, aweme_id, "play", 720, 1280, 2000000, protocol_relative=True))
+    elif case == "download_addr_only":
+        video.update(download_addr=download_addr)
+    elif case == "watermarked_play":
+        video.update(play_addr=_addr(rng, aweme_id, "play", 1080, 1920, 3000000, watermark=True),
+                     bit_rate=[])
+    elif case == "no_dimensions":
+        video = {"play_addr": _addr(rng, aweme_id, "play", 0, 0, 0),
+                 "bit_rate": _bit_rates(rng, aweme_id, missing_size=True)}
+    elif case == "empty_url_lists":
+        play_addr["url_list"] = []
+        video.update(play_addr=play_addr, bit_rate=[{"gear_name": "normal_720_0", "bit_rate": 1000000,
+                                                      "play_addr": {"url_list": []}}])
+    elif case == "no_video":
+        video = None  # 图文作品
+        aweme["images"] = [{"url_list": [f"https://p3.example-img.com/{aweme_id}.webp"]}]
+    elif case == "empty_desc":
+        aweme["desc"] = "   "
+        video.update(play_addr=play_addr)
+    elif case == "long_desc":
+        aweme["desc"] = "很长的描述" * 20 + "!?/\\:*"
+        video.update(play_addr=play_addr, bit_rate=_bit_rates(rng, aweme_id))
+    elif case == "null_fields":
+        aweme["author"] = None
+        aweme["desc"] = None
+        video.update(play_addr=play_addr)
+    elif case == "numeric_id":
+        aweme["aweme_id"] = aweme_id
+        video.update(play_addr=play_addr)
+    else:
+        raise ValueError(case)
+    if video is not None:
+        aweme["video"] = video
+    return aweme
+
+CASES = ("full", "full", "full", "no_play_addr", "bit_rate_only", "protocol_relative", "download_addr_only",
+         "watermarked_play", "no_dimensions", "empty_url_lists", "no_video", "empty_desc", "long_desc",
+         "null_fields", "numeric_id")
+
+def make_packet(kind, awemes, cursor, has_more):
+    """按接口类型包装成响应数据包"""
+    packet = {"status_code": 0, "aweme_list": awemes, "has_more": 1 if has_more else 0}
+    if kind == "listcollection":
+        packet["cursor"] = cursor
+    else:
+        packet["max_cursor"] = cursor
+        packet["min_cursor"] = 0
+    return packet
+
+def synthetic_packets(items, page_size=18, seed=7, kinds=("post", "favorite", "listcollection"),
+                      duplicate_rate=0.02):
+    """生成约items个视频的数据包，用于大规模测试；少量aweme_id会在后面的页中重复出现"""
+    rng = random.Random(seed)
+    packets = []
+    produced = 0
+    next_id = 7300000000000000000
+    created = 0
+    recent = []
+    while produced < items:
+        kind = kinds[len(packets) % len(kinds)]
+        awemes = []
+        for _ in range(min(page_size, items - produced)):
+            if recent and rng.random() < duplicate_rate:
+                awemes.append(rng.choice(recent))
+            else:
+                next_id += rng.randint(1, 5000)
+                aweme = make_aweme(rng, next_id, CASES[created % len(CASES)])
+                created += 1
+                awemes.append(aweme)
+                recent = (recent + [aweme])[-50:]
+            produced += 1
+        packets.append(make_packet(kind, awemes, 1700000000000 - len(packets), produced < items))
+    return packets
+
+def load_corpus():
+    """读取固定语料，返回 [(文件名, [数据包, ...]), ...]"""
+    corpus = []
+    for name in CORPUS_FILES:
+        with open(os.path.join(CORPUS_DIR, name), 'r', encoding='utf-8') as f:
+            corpus.append((name, json.load(f)))
+    return corpus
+
+def write_corpus():
+    """生成固定语料：每个文件覆盖所有情况，并包含跨页重复的视频"""
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    for index, name in enumerate(CORPUS_FILES):
+        kind = name[:-len(".json")]
+        packets = synthetic_packets(2 * len(CASES), page_size=len(CASES) // 2, seed=100 + index,
+                                    kinds=(kind,), duplicate_rate=0.1)
+        with open(os.path.join(CORPUS_DIR, name), 'w', encoding='utf-8') as f:
+            json.dump(packets, f, ensure_ascii=False, indent=1)
+
+if __name__ == "__main__":
+    write_corpus()
+    print(f"语料已写入 {CORPUS_DIR}")
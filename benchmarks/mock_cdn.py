@@ -0,0 +1,209 @@
+"""模拟抖音视频CDN的本地HTTP服务器，供下载性能测试使用
+
+可以配置文件大小、首字节延迟、单连接带宽、是否支持Range、403/5xx故障注入和重定向。
+文件内容由文件名确定性生成，不占用内存，下载结果可以用expected_digest校验。
+
+单独运行: python benchmarks/mock_cdn.py --port 8000 --latency 0.05 --bandwidth 2MB
+"""
+import argparse
+import hashlib
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BLOCK_SIZE = 1024 * 1024
+BLOCK = random.Random(20240501).randbytes(BLOCK_SIZE) if hasattr(random.Random, 'randbytes') else \
+    bytes(random.Random(20240501).getrandbits(8) for _ in range(BLOCK_SIZE))
+
+def parse_size(text):
+    """把 "512k"、"2MB"、"1048576" 转换为字节数"""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([kmg]?)i?b?\s*', str(text).lower())
+    if not match:
+        raise ValueError(f"无法解析大小: {text}")
+    return int(float(match.group(1)) * {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}[match.group(2)])
+
+def file_offset(name):
+    return zlib.crc32(name.encode()) % BLOCK_SIZE
+
+def file_bytes(name, start, end):
+    """文件name中 [start, end) 范围的内容"""
+    offset = (file_offset(name) + start) % BLOCK_SIZE
+    length = end - start
+    parts = []
+    while length > 0:
+        piece = BLOCK[offset:offset + length]
+        parts.append(piece)
+        length -= len(piece)
+        offset = 0
+    return b''.join(parts)
+
+def expected_digest(name, size):
+    """与app.file_digest相同算法的预期摘要，用于校验下载结果"""
+    digest = hashlib.blake2b(digest_size=16)
+    for start in range(0, size, BLOCK_SIZE):
+        digest.update(file_bytes(name, start, min(size, start + BLOCK_SIZE)))
+    return digest.hexdigest()
+
+class CdnConfig:
+    """服务器行为配置，运行中修改会立即影响之后的请求"""
+
+    def __init__(self, latency=0.0, bandwidth=0, ranges=True, fail_403=0.0, fail_5xx=0.0,
+                 redirect=0.0, seed=1):
+        self.files = {}  # 文件名 -> 大小
+        self.latency = latency  # 首字节延迟（秒）
+        self.bandwidth = bandwidth  # 单个连接的带宽（字节/秒），0表示不限
+        self.ranges = ranges  # 是否支持Range请求
+        self.fail_403 = fail_403  # 文件永久返回403的比例，模拟链接过期
+        self.fail_5xx = fail_5xx  # 每个请求随机返回503的概率
+        self.redirect = redirect  # 通过302重定向访问的文件比例
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.forbidden = set()
+        self.redirected = set()
+        self.stats = {'requests': 0, '403': 0, '5xx': 0, 'redirects': 0, 'bytes': 0}
+
+    def add_file(self, name, size):
+        with self.lock:
+            self.files[name] = size
+            if self.random.random() < self.fail_403:
+                self.forbidden.add(name)
+            if self.random.random() < self.redirect:
+                self.redirected.add(name)
+
+    def url_path(self, name):
+        """任务应当请求的路径，需要重定向的文件先访问 /r/ 路径"""
+        return f"/r/{name}" if name in self.redirected else f"/v/{name}"
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def roll_5xx(self):
+        with self.lock:
+            return self.random.random() < self.fail_5xx
+
+class CdnHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None  # 由make_server设置为CdnConfig
+
+    def log_message(self, format, *args):
+        pass
+
+    def _empty(self, status, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _serve(self, with_body):
+        config = self.config
+        config.count('requests')
+        path = self.path.split('?')[0]
+        kind, _, name = path.strip('/').partition('/')
+        if config.latency:
+            time.sleep(config.latency)
+        if kind == 'r' and name in config.files:
+            config.count('redirects')
+            self._empty(302, {"Location": f"/v/{name}"})
+            return
+        if kind != 'v' or name not in config.files or name in config.forbidden:
+            config.count('403')
+            self._empty(403)
+            return
+        if config.roll_5xx():
+            config.count('5xx')
+            self._empty(503, {"Retry-After": "0"})
+            return
+
+        total = config.files[name]
+        start, end = 0, total
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+        if match and config.ranges:
+            start = int(match.group(1))
+            end = min(total, int(match.group(2)) + 1) if match.group(2) else total
+            if start >= total:
+                self._empty(416, {"Content-Range": f"bytes */{total}"})
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{total}")
+        else:
+            self.send_response(200)
+        if config.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", f'"{file_offset(name):x}-{total}"')
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(end - start))
+        self.end_headers()
+        if with_body:
+            self._write_body(name, start, end)
+
+    def _write_body(self, name, start, end):
+        bandwidth = self.config.bandwidth
+        chunk = 64 * 1024
+        if bandwidth:
+            chunk = max(4096, min(chunk, bandwidth // 20))
+        began = time.monotonic()
+        sent = 0
+        position = start
+        try:
+            while position < end:
+                data = file_bytes(name, position, min(end, position + chunk))
+                self.wfile.write(data)
+                position += len(data)
+                sent += len(data)
+                if bandwidth:
+                    ahead = sent / bandwidth - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端暂停或取消时会主动断开
+        finally:
+            self.config.count('bytes', sent)
+
+    def do_GET(self):
+        self._serve(True)
+
+    def do_HEAD(self):
+        self._serve(False)
+
+class CdnServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # 大量任务同时连接时避免被拒绝
+
+def make_server(config, host="127.0.0.1", port=0):
+    """创建并在后台线程启动服务器，返回 (server, base_url)"""
+    handler = type('ConfiguredCdnHandler', (CdnHandler,), {'config': config})
+    server = CdnServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="mock-cdn", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟抖音CDN的本地服务器")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--files', type=int, default=100, help="生成的文件数量，路径为 /v/0.mp4 ...")
+    parser.add_argument('--size', default='1MB')
+    parser.add_argument('--latency', type=float, default=0.0, help="首字节延迟（秒）")
+    parser.add_argument('--bandwidth', default='0', help="单连接带宽，例如 2MB，0为不限")
+    parser.add_argument('--no-range', action='store_true', help="不支持Range请求")
+    parser.add_argument('--fail-403', type=float, default=0.0)
+    parser.add_argument('--fail-5xx', type=float, default=0.0)
+    parser.add_argument('--redirect', type=float, default=0.0)
+    args = parser.parse_args()
+    config = CdnConfig(args.latency, parse_size(args.bandwidth), not args.no_range,
+                       args.fail_403, args.fail_5xx, args.redirect)
+    for index in range(args.files):
+        config.add_file(f"{index}.mp4", parse_size(args.size))
+    server, base = make_server(config, port=args.port)
+    print(f"模拟CDN已启动: {base}{config.url_path('0.mp4')}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""内嵌浏览器：加载抖音页面、注入抓取脚本并收集登录Cookie
+
+只有图形界面会用到这个模块。导入它会加载QtWebEngine，命令行模式不导入。
+"""
+import logging
+import os
+
+# WebEngine的Chromium参数必须在第一个页面创建之前设置
+os.environ["QTWEBENGINE_CHROMIUM_FLAGS"] = "--disable-gpu --no-sandbox"
+
+from PyQt5.QtCore import pyqtSlot, QObject, pyqtSignal, QFile, QIODevice
+from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEnginePage, QWebEngineProfile, QWebEngineScript
+from PyQt5.QtWebChannel import QWebChannel
+
+log = logging.getLogger('douyin.browser')
+
+def configure_profile():
+    """配置默认的WebEngine配置文件，需要在QApplication创建之后调用"""
+    profile = QWebEngineProfile.defaultProfile()
+    profile.setHttpCacheType(QWebEngineProfile.MemoryHttpCache)
+    return profile
+
+# 注入页面的抓取脚本：原样转发列表接口的响应文本，不在页面里解析和重新序列化
+CAPTURE_JS = """
+(function() {
+    if (window.__douyinCaptureInstalled) {
+        return;
+    }
+    window.__douyinCaptureInstalled = true;
+
+    let bridge = null;
+    const pending = [];
+    const hasChannel = typeof QWebChannel !== 'undefined' && typeof qt !== 'undefined';
+    if (hasChannel) {
+        new QWebChannel(qt.webChannelTransport, function(channel) {
+            bridge = channel.objects.douyinBridge;
+            pending.splice(0).forEach(item => bridge.push(item[0], item[1]));
+        });
+    }
+
+    function send(url, text) {
+        if (bridge) {
+            bridge.push(url, text);
+        } else if (hasChannel) {
+            pending.push([url, text]);  // 通道还没有连接好
+        } else {
+            console.log('DOUYIN_JSON:' + text);  // 没有QWebChannel时退回到控制台输出
+        }
+    }
+
+    function isTarget(url, contentType) {
+        return url && (url.includes('listcollection') ||
+                       url.includes('aweme/post') ||
+                       url.includes('aweme/favorite')) &&
+               contentType && contentType.includes('application/json');
+    }
+
+    // 覆盖XMLHttpRequest原型
+    const originalOpen = XMLHttpRequest.prototype.open;
+    XMLHttpRequest.prototype.open = function(method, url) {
+        this._method = method;
+        this._url = String(url);
+        return originalOpen.apply(this, arguments);
+    };
+
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function(body) {
+        this.addEventListener('load', () => {
+            if (!isTarget(this._url, this.getResponseHeader('Content-Type'))) {
+                return;
+            }
+            if (this.responseType === '' || this.responseType === 'text') {
+                send(this._url, this.responseText);
+            } else if (this.responseType === 'json') {
+                send(this._url, JSON.stringify(this.response));
+            }
+        });
+        return originalSend.apply(this, arguments);
+    };
+
+    // 覆盖fetch API
+    const originalFetch = window.fetch;
+    window.fetch = function(input, init) {
+        const requestUrl = typeof input === 'string' ? input : input.url;
+        return originalFetch(input, init).then(response => {
+            if (isTarget(requestUrl, response.headers.get('Content-Type'))) {
+                response.clone().text().then(text => send(requestUrl, text));
+            }
+            return response;
+        });
+    };
+})();
+"""
+
+class JsonBridge(QObject):
+    """通过QWebChannel暴露给页面的对象，接收列表接口的原始响应文本"""
+    raw_received = pyqtSignal(str)
+
+    @pyqtSlot(str, str)
+    def push(self, url, body):
+        # 只转发字符串，JSON在提取线程中解析
+        self.raw_received.emit(body)
+
+class WebPage(QWebEnginePage):
+    raw_json_received = pyqtSignal(str)  # 列表接口的原始响应文本
+    
+    def __init__(self, profile, parent=None):
+        super().__init__(profile, parent)
+        self.bridge = JsonBridge(self)
+        self.bridge.raw_received.connect(self.raw_json_received)
+        self.channel = QWebChannel(self)
+        self.channel.registerObject('douyinBridge', self.bridge)
+        self.setWebChannel(self.channel)
+        self.install_capture_script()
+
+    def install_capture_script(self):
+        """在页面脚本执行之前注入qwebchannel.js和抓取脚本，首屏请求也能捕获到"""
+        qwebchannel_js = ''
+        source = QFile(':/qtwebchannel/qwebchannel.js')
+        if source.open(QIODevice.ReadOnly):
+            qwebchannel_js = bytes(source.readAll()).decode('utf-8')
+            source.close()
+        script = QWebEngineScript()
+        script.setName('douyin-capture')
+        script.setSourceCode(qwebchannel_js + '\n' + CAPTURE_JS)
+        script.setInjectionPoint(QWebEngineScript.DocumentCreation)
+        script.setWorldId(QWebEngineScript.MainWorld)
+        script.setRunsOnSubFrames(False)
+        self.scripts().insert(script)
+    
+    def javaScriptConsoleMessage(self, level, message, line, source_id):
+        if message.startswith('DOUYIN_JSON:'):
+            self.raw_json_received.emit(message[len('DOUYIN_JSON:'):])
+
+class WebEngineView(QWebEngineView):
+    def __init__(self, target_url, cookies=None, parent=None):
+        super().__init__(parent)
+        self.target_url = target_url
+        self.captured_count = 0  # 捕获到的数据包数量，数据包本身交给提取线程处理
+        
+        # 创建自定义页面，抓取脚本随页面一起注入
+        self.custom_page = WebPage(self.page().profile(), self)
+        self.setPage(self.custom_page)
+        
+        # 连接信号
+        self.custom_page.raw_json_received.connect(self.handle_json_response)
+
+        # 收集登录后的Cookie，供接口翻页抓取使用
+        self.cookies = cookies if cookies is not None else {}
+        cookie_store = self.page().profile().cookieStore()
+        cookie_store.cookieAdded.connect(self.on_cookie_added)
+        cookie_store.cookieRemoved.connect(self.on_cookie_removed)
+        cookie_store.loadAllCookies()
+
+    def on_cookie_added(self, cookie):
+        if 'douyin.com' in cookie.domain():
+            name = bytes(cookie.name()).decode('utf-8', 'ignore')
+            self.cookies[name] = bytes(cookie.value()).decode('utf-8', 'ignore')
+
+    def on_cookie_removed(self, cookie):
+        if 'douyin.com' in cookie.domain():
+            self.cookies.pop(bytes(cookie.name()).decode('utf-8', 'ignore'), None)
+
+    def handle_json_response(self, data=None):
+        self.captured_count += 1
+        log.debug("捕获到新的列表数据，当前已捕获 %d 个数据包", self.captured_count)
+    
+    # 添加重置方法
+    def reset_captured_data(self):
+        self.captured_count = 0
+        log.info("已重置捕获的数据")